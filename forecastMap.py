@@ -1,3 +1,6 @@
+import os
+import sys
+
 import cartopy
 import cartopy.crs as ccrs
 import cartopy.io.shapereader as shpreader
@@ -9,6 +12,10 @@ import matplotlib.patheffects as PathEffects
 import numpy as np
 import shapefile
 
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plots'))
+import _counties
+
 # Define the projection.
 ax = plt.axes(projection=ccrs.LambertConformal(central_latitude=35, central_longitude=-98,
                                                standard_parallels=(30, 60)))
@@ -31,10 +38,9 @@ ax.add_feature(cfeature.STATES.with_scale('50m'),linewidth=.5,
                                                  edgecolor='black',
                                                  zorder=6)
 
-# Use the cartopy shapefile reader to import custom county map.
-reader = shpreader.Reader('./county_map/countyl010g.shp')
-counties = list(reader.geometries())
-COUNTIES = cfeature.ShapelyFeature(counties, ccrs.PlateCarree())
+# Load the county lines clipped to this map.
+COUNTIES = _counties.load([-104.1, -95.5, 32.1, 39.1],
+                          shp_path='./county_map/countyl010g.shp').feature()
 
 ax.add_feature(COUNTIES,linewidth=.5,facecolor='none',edgecolor='#595959',zorder=4)
 
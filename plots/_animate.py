@@ -0,0 +1,60 @@
+import os
+import shutil
+import subprocess
+import tempfile
+
+from PIL import Image
+
+import _metrics
+
+
+def _frames(paths):
+    # Load the frames onto one canvas size; bbox_inches='tight' can leave
+    # them a few pixels apart.
+    images = [Image.open(path).convert('RGB') for path in paths]
+    width = max(image.size[0] for image in images)
+    height = max(image.size[1] for image in images)
+    frames = []
+    for image in images:
+        if image.size != (width, height):
+            canvas = Image.new('RGB', (width, height), 'white')
+            canvas.paste(image, (0, 0))
+            image = canvas
+        frames.append(image)
+    return frames
+
+
+@_metrics.stage('animate')
+def write_animation(paths, path, fps=2, loop=0):
+    # Assemble rendered frames into an animated .gif, .png (APNG) or .mp4.
+    if not paths:
+        raise ValueError('No frames to animate')
+    frames = _frames(paths)
+    ext = os.path.splitext(path)[1].lower()
+    duration = int(round(1000. / fps))
+
+    if ext == '.gif':
+        frames = [frame.quantize(colors=256) for frame in frames]
+        frames[0].save(path, save_all=True, append_images=frames[1:],
+                       duration=duration, loop=loop)
+    elif ext in ('.png', '.apng'):
+        frames[0].save(path, format='PNG', save_all=True, append_images=frames[1:],
+                       duration=duration, loop=loop)
+    elif ext == '.mp4':
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is None:
+            raise RuntimeError('ffmpeg is needed to write %s' % path)
+        tmp = tempfile.mkdtemp()
+        try:
+            for i, frame in enumerate(frames):
+                frame.save(os.path.join(tmp, '%04d.png' % i))
+            subprocess.check_call([ffmpeg, '-y', '-loglevel', 'error',
+                                   '-framerate', str(fps),
+                                   '-i', os.path.join(tmp, '%04d.png'),
+                                   '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+                                   '-pix_fmt', 'yuv420p', path])
+        finally:
+            shutil.rmtree(tmp)
+    else:
+        raise ValueError('Unsupported animation format: %s' % ext)
+    return path
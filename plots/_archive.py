@@ -0,0 +1,146 @@
+from datetime import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+import _config
+import _ncss_cache
+
+# Fetched model fields as plain float32 .npy files, laid out
+# <model>/<run>/<valid time>_<box>/<variable>/, one <level>.npy per level
+# or one column.npy holding every level. Readers memory-map them, so every
+# process shares one copy in the page cache and only touches the pages it
+# reads. PLOTS_ARCHIVE=0 turns it off.
+ARCHIVE_DIR = os.path.join(_config.CACHE_DIR, 'archive')
+ENABLED = _config.flag('PLOTS_ARCHIVE', True)
+
+# Runs kept per model; older ones are dropped when a new run arrives.
+KEEP_RUNS = int(os.environ.get('PLOTS_ARCHIVE_RUNS', '4'))
+
+# Grid coordinates stored with every valid time.
+GRID = ('lon', 'lat', 'x', 'y')
+
+
+def _tmp(path):
+    return '%s.%d.%d' % (path, os.getpid(), threading.get_ident())
+
+
+def _save_array(path, values):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = _tmp(path)
+    with open(tmp, 'wb') as f:
+        np.save(f, values)
+    os.replace(tmp, path)
+
+
+def _save_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = _tmp(path)
+    with open(tmp, 'w') as f:
+        json.dump(value, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def model_name(url):
+    # e.g. RAP_CONUS_13km for .../grib/NCEP/RAP/CONUS_13km/latest.xml.
+    return '_'.join(url.split('/')[-3:-1])
+
+
+def directory(url, time, box):
+    # Where one valid time of the latest run of a catalog is kept, for the
+    # lon/lat box it was fetched over (NCSS subsets differ per box).
+    run = os.path.splitext(_ncss_cache.latest_run(url)[0])[0]
+    time = _ncss_cache.round_hour(time)
+    box = hashlib.sha256(json.dumps(sorted(box.items())).encode()).hexdigest()[:12]
+    return os.path.join(ARCHIVE_DIR, model_name(url), run,
+                        '%s_%s' % (time.strftime('%Y%m%d%H'), box))
+
+
+def _field_path(directory, variable, level):
+    return os.path.join(directory, variable, '%g.npy' % level)
+
+
+def has(directory, variable, level):
+    if not ENABLED:
+        return False
+    return (os.path.exists(_field_path(directory, variable, level)) or
+            float(level) in (levels(directory, variable) or []))
+
+
+def load(directory, variable, level):
+    # A field, memory-mapped, from its own file or its variable's column.
+    path = _field_path(directory, variable, level)
+    if os.path.exists(path):
+        return np.load(path, mmap_mode='r')
+    return load_column(directory, variable)[levels(directory, variable).index(float(level))]
+
+
+def save(directory, variable, level, values):
+    values = np.ma.filled(np.ma.asarray(values, dtype=np.float32), np.nan)
+    _save_array(_field_path(directory, variable, level), values)
+
+
+def levels(directory, variable):
+    # Every level of a variable, when a full column of it was stored.
+    try:
+        with open(os.path.join(directory, variable, 'levels.json')) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def save_column(directory, variable, levels, cube):
+    # All levels of a variable as one (level, y, x) array, then the list of
+    # them, so readers only see complete columns.
+    cube = np.ma.filled(np.ma.asarray(cube, dtype=np.float32), np.nan)
+    _save_array(os.path.join(directory, variable, 'column.npy'), cube)
+    _save_json(os.path.join(directory, variable, 'levels.json'), [float(l) for l in levels])
+
+
+def load_column(directory, variable):
+    # Every stored level of a variable, memory-mapped, in levels() order.
+    return np.load(os.path.join(directory, variable, 'column.npy'), mmap_mode='r')
+
+
+def load_grid(directory):
+    # Grid coordinates, valid time and grid mapping attributes, or None
+    # when nothing is stored for this valid time yet.
+    if not ENABLED:
+        return None
+    try:
+        with open(os.path.join(directory, 'grid.json')) as f:
+            meta = json.load(f)
+    except (IOError, ValueError):
+        return None
+    grid = dict((name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+                for name in GRID)
+    grid['valid'] = datetime.strptime(meta['valid'], '%Y-%m-%dT%H:%M:%S')
+    grid['mapping'] = meta['mapping']
+    return grid
+
+
+def save_grid(directory, valid, mapping, **coords):
+    # Coordinates first and the JSON last, which marks the grid complete.
+    # A new run for the model drops the oldest beyond KEEP_RUNS.
+    if not ENABLED or os.path.exists(os.path.join(directory, 'grid.json')):
+        return
+    for name in GRID:
+        if coords.get(name) is not None:
+            _save_array(os.path.join(directory, name + '.npy'), np.ma.filled(coords[name]))
+    mapping = dict((key, np.asarray(value).tolist()) for key, value in mapping.items())
+    _save_json(os.path.join(directory, 'grid.json'),
+               {'valid': valid.strftime('%Y-%m-%dT%H:%M:%S'), 'mapping': mapping})
+    prune(os.path.dirname(os.path.dirname(directory)))
+
+
+def prune(model_dir, keep=KEEP_RUNS):
+    # Drop all but the newest runs of a model. Run names end in their date
+    # and hour, so they sort by age.
+    runs = sorted(os.listdir(model_dir))
+    for run in runs[:-keep]:
+        shutil.rmtree(os.path.join(model_dir, run), ignore_errors=True)
+
@@ -0,0 +1,89 @@
+import hashlib
+import os
+
+import numpy as np
+from scipy.spatial import Delaunay
+
+import _config
+import _metrics
+
+# Barb sampling weights per grid, projection, extent and density.
+BARBS_DIR = os.path.join(_config.CACHE_DIR, 'barbs')
+
+# Samplers already loaded by this process.
+_samplers = {}
+
+
+class BarbSampler(object):
+    # Linear interpolation from a projected grid onto a regular grid of barb
+    # positions: the three grid points around each position and their
+    # barycentric weights. Positions off the grid are left out.
+
+    def __init__(self, x, y, vertices, weights):
+        self.x = x
+        self.y = y
+        self.vertices = vertices
+        self.weights = weights
+
+    def __call__(self, u, v):
+        # Barb positions and u/v there, gathered in one step each.
+        u = (np.asarray(u).ravel()[self.vertices] * self.weights).sum(axis=1)
+        v = (np.asarray(v).ravel()[self.vertices] * self.weights).sum(axis=1)
+        return self.x, self.y, u, v
+
+
+def regrid_shape(density, extent):
+    # Barbs across and down the map, as cartopy sizes regrid_shape: the
+    # shorter side gets `density`.
+    x0, x1, y0, y1 = extent
+    aspect = (x1 - x0) / float(y1 - y0)
+    if aspect >= 1:
+        return int(density * aspect), density
+    return density, int(density / aspect)
+
+
+def _build(grid, extent, density):
+    nx, ny = regrid_shape(density, extent)
+    x0, x1, y0, y1 = extent
+    x, y = np.meshgrid(np.linspace(x0, x1, nx), np.linspace(y0, y1, ny))
+    x, y = x.ravel(), y.ravel()
+
+    mesh = Delaunay(np.column_stack([grid.x.ravel(), grid.y.ravel()]))
+    targets = np.column_stack([x, y])
+    simplex = mesh.find_simplex(targets)
+    inside = simplex >= 0
+    simplex = simplex[inside]
+    affine = mesh.transform[simplex]
+    b = np.einsum('ijk,ik->ij', affine[:, :2], targets[inside] - affine[:, 2])
+    weights = np.column_stack([b, 1 - b.sum(axis=1)])
+    return x[inside], y[inside], mesh.simplices[simplex].astype(np.int32), weights
+
+
+def sampler(grid, projection, extent, density=15):
+    # The barb sampler for a projected grid on a map extent (in map
+    # coordinates). Built once and kept on disk.
+    digest = hashlib.md5()
+    for coord in (grid.x, grid.y):
+        digest.update(np.ascontiguousarray(coord).tobytes())
+    parts = [digest.hexdigest(), projection.proj4_init, np.round(extent, 3).tolist(),
+             density]
+    key = hashlib.sha256(repr(parts).encode()).hexdigest()
+    if key not in _samplers:
+        path = os.path.join(BARBS_DIR, key + '.npz')
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                arrays = [saved[name] for name in ('x', 'y', 'vertices', 'weights')]
+        else:
+            arrays = _build(grid, extent, density)
+            os.makedirs(BARBS_DIR, exist_ok=True)
+            tmp = path + '.%d.npz' % os.getpid()
+            np.savez(tmp, **dict(zip(('x', 'y', 'vertices', 'weights'), arrays)))
+            os.replace(tmp, path)
+        _samplers[key] = BarbSampler(*arrays)
+    return _samplers[key]
+
+
+@_metrics.stage('barbs')
+def sample(ax, grid, u, v, density=15):
+    # Barb positions and u/v for a map, in place of barbs(regrid_shape=...).
+    return sampler(grid, ax.projection, ax.get_extent(), density)(u, v)
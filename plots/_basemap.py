@@ -0,0 +1,148 @@
+import hashlib
+import os
+
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import cartopy.io.shapereader as shpreader
+import matplotlib.pyplot as plt
+import numpy as np
+
+import _config
+import _counties
+import _metrics
+
+# Prerendered layers live here; PLOTS_BASEMAP_CACHE=0 draws vectors instead.
+BASEMAP_DIR = os.path.join(_config.CACHE_DIR, 'basemap')
+CACHE = _config.flag('PLOTS_BASEMAP_CACHE', True)
+
+# Map features per style, as drawn by the product scripts.
+_ANL = [
+    ('OCEAN', dict(facecolor='#F2F2F2', edgecolor='black', zorder=0, linewidth=.5)),
+    ('LAND', dict(edgecolor='black', facecolor='#E1E1E1', zorder=1)),
+    ('BORDERS', dict(zorder=4, linewidth=.5, edgecolor='black')),
+    ('COASTLINE', dict(zorder=4, linewidth=.5, edgecolor='black')),
+    ('LAKES', dict(zorder=2, linewidth=.5, edgecolor='black', facecolor='#F2F2F2')),
+    ('STATES', dict(linewidth=.5, edgecolor='black', zorder=5)),
+]
+
+STYLES = {
+    'anl': _ANL,
+    'hrrr': _ANL + [
+        ('COUNTIES', dict(linewidth=.5, facecolor='none', edgecolor='black', zorder=4,
+                          alpha=.3)),
+    ],
+    'wind': [
+        ('OCEAN', dict(facecolor='grey', edgecolor='black', zorder=0, linewidth=.5)),
+        ('LAND', dict(edgecolor='black', facecolor='grey', zorder=1)),
+        ('BORDERS', dict(zorder=4, linewidth=.5, edgecolor='black')),
+        ('COASTLINE', dict(zorder=4, linewidth=.5, edgecolor='black')),
+        ('LAKES', dict(zorder=2, linewidth=.5, edgecolor='black', facecolor='grey')),
+        ('STATES', dict(linewidth=.5, edgecolor='black', zorder=5)),
+    ],
+}
+
+# Forecast area outline drawn over most products.
+FA_SHP = os.path.join(_config.MAP_FILES, 'fa', 'fa3.shp')
+
+# Layers already loaded by this process.
+_layers = {}
+
+# Forecast area geometries, once read by this process.
+_forecast_area = None
+
+
+def _feature(name, ax):
+    if name == 'COUNTIES':
+        return _counties.load(ax.get_extent(ccrs.PlateCarree())).feature()
+    return getattr(cfeature, name).with_scale('50m')
+
+
+def _key(ax, style, layer, dpi):
+    parts = [ax.projection.proj4_init,
+             np.round(ax.get_extent(), 6).tolist(),
+             np.round(ax.figure.get_size_inches(), 4).tolist(),
+             np.round(ax.get_position().bounds, 6).tolist(),
+             style, layer, dpi]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def _render_layer(ax, features, dpi):
+    # Draw the features alone on a transparent copy of the axes and keep
+    # the pixels inside the map.
+    fig = plt.figure(figsize=ax.figure.get_size_inches(), dpi=dpi)
+    fig.patch.set_alpha(0)
+    lax = fig.add_axes(ax.get_position().bounds, projection=ax.projection)
+    lax.set_extent(ax.get_extent(), crs=ax.projection)
+    lax.patch.set_facecolor('none')
+    lax.spines['geo'].set_visible(False)
+    for name, kwargs in features:
+        lax.add_feature(_feature(name, lax), **kwargs)
+
+    fig.canvas.draw()
+    pixels = np.asarray(fig.canvas.buffer_rgba())
+    x0, y0, x1, y1 = np.round(lax.bbox.extents).astype(int)
+    height = pixels.shape[0]
+    layer = pixels[height - y1:height - y0, x0:x1].copy()
+    plt.close(fig)
+    return layer
+
+
+def _layer(ax, style, layer, features, dpi):
+    key = _key(ax, style, layer, dpi)
+    if key not in _layers:
+        path = os.path.join(BASEMAP_DIR, key + '.npy')
+        if os.path.exists(path):
+            _layers[key] = np.load(path)
+        else:
+            pixels = _render_layer(ax, features, dpi)
+            os.makedirs(BASEMAP_DIR, exist_ok=True)
+            tmp = path + '.%d.npy' % os.getpid()
+            np.save(tmp, pixels)
+            os.replace(tmp, path)
+            _layers[key] = pixels
+    return _layers[key]
+
+
+@_metrics.stage('basemap')
+def add_basemap(ax, style, dpi=300, split=3):
+    # Add a style's map features to a map whose extent is already set.
+    # Features below zorder `split` are baked into a background image and
+    # the rest into a foreground image, so data drawn at `split` and above
+    # lands between the two.
+    features = STYLES[style]
+    if not CACHE:
+        for name, kwargs in features:
+            ax.add_feature(_feature(name, ax), **kwargs)
+        return
+
+    extent = ax.get_extent()
+    back = [f for f in features if f[1]['zorder'] < split]
+    fore = [f for f in features if f[1]['zorder'] >= split]
+    for layer, group in (('back', back), ('fore', fore)):
+        if group:
+            pixels = _layer(ax, style, layer, group, dpi)
+            ax.imshow(pixels, extent=extent, origin='upper', transform=ax.projection,
+                      interpolation='nearest',
+                      zorder=max(kwargs['zorder'] for _, kwargs in group))
+    ax.set_extent(extent, crs=ax.projection)
+
+
+def forecast_area():
+    # The forecast area outline's geometries, read once per process; renderd
+    # reads them before it forks, so its renders never do.
+    global _forecast_area
+    if _forecast_area is None:
+        _forecast_area = list(shpreader.Reader(FA_SHP).geometries())
+    return _forecast_area
+
+
+def preload():
+    # Load every cached layer now, e.g. in a long-lived process whose
+    # forked renders should find them already in memory.
+    if not os.path.isdir(BASEMAP_DIR):
+        return 0
+    for name in os.listdir(BASEMAP_DIR):
+        key, ext = os.path.splitext(name)
+        if ext == '.npy' and '.' not in key and key not in _layers:
+            _layers[key] = np.load(os.path.join(BASEMAP_DIR, name))
+    return len(_layers)
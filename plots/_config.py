@@ -0,0 +1,33 @@
+import os
+
+# Repository root and the shared map files.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAP_FILES = os.path.join(ROOT, 'mapFiles')
+
+# Local cache for fetched data, set with PLOTS_CACHE_DIR.
+CACHE_DIR = os.environ.get('PLOTS_CACHE_DIR',
+                           os.path.join(os.path.expanduser('~'), '.cache',
+                                        'pythonPlayground'))
+
+# Point every catalog at another THREDDS server (e.g. a local stand-in)
+# with PLOTS_THREDDS=http://localhost:8080/thredds.
+THREDDS = os.environ.get('PLOTS_THREDDS')
+_SERVERS = ('https://thredds-test.unidata.ucar.edu/thredds',
+            'https://thredds.ucar.edu/thredds')
+
+
+def thredds(url):
+    # Rewrite a data server URL to PLOTS_THREDDS when it is set.
+    if THREDDS:
+        for server in _SERVERS:
+            if url.startswith(server):
+                return THREDDS.rstrip('/') + url[len(server):]
+    return url
+
+
+def flag(name, default=False):
+    # Read an on/off switch from the environment.
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() not in ('', '0', 'false', 'no', 'off')
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import struct
+
+import cartopy.crs as ccrs
+import cartopy.feature as cfeature
+import numpy as np
+import shapefile
+from shapely.geometry import LineString, MultiLineString, box
+from shapely.strtree import STRtree
+
+import _config
+
+# County boundary lines, set with PLOTS_COUNTY_SHP, and where the clipped
+# copies are kept.
+COUNTY_SHP = os.environ.get('PLOTS_COUNTY_SHP',
+                            os.path.join(_config.MAP_FILES, 'county_map', 'countyl010g.shp'))
+COUNTY_DIR = os.path.join(_config.CACHE_DIR, 'counties')
+
+# Stores already loaded by this process.
+_stores = {}
+
+
+def _sbn_boxes(sbn_path):
+    # Approximate bounding box of every record from the ESRI .sbn index.
+    # Each bin holds 8-byte entries: xmin, ymin, xmax, ymax quantized to
+    # 0-255 across the file bounds, then the 1-based record number.
+    with open(sbn_path, 'rb') as f:
+        data = f.read()
+    count = struct.unpack('>i', data[28:32])[0]
+    xmin, ymin, xmax, ymax = struct.unpack('>4d', data[32:64])
+    start = 108 + struct.unpack('>i', data[104:108])[0] * 2
+
+    entries = []
+    offset = start
+    while offset + 8 <= len(data):
+        size = struct.unpack('>i', data[offset + 4:offset + 8])[0] * 2
+        entries.append(data[offset + 8:offset + 8 + size])
+        offset += 8 + size
+    entries = np.frombuffer(b''.join(entries), dtype=[('box', 'u1', 4), ('id', '>i4')])
+
+    if len(entries) != count or entries['id'].min() < 1 or entries['id'].max() > count:
+        raise ValueError('Unexpected layout in %s' % sbn_path)
+
+    # Widen by one step so the boxes never undercut the real ones.
+    q = entries['box'].astype(float)
+    boxes = np.empty((count, 4))
+    ids = entries['id'] - 1
+    boxes[ids, 0] = xmin + (q[:, 0] - 1) / 255. * (xmax - xmin)
+    boxes[ids, 1] = ymin + (q[:, 1] - 1) / 255. * (ymax - ymin)
+    boxes[ids, 2] = xmin + (q[:, 2] + 1) / 255. * (xmax - xmin)
+    boxes[ids, 3] = ymin + (q[:, 3] + 1) / 255. * (ymax - ymin)
+    return boxes
+
+
+def _shx_boxes(shp_path):
+    # Exact bounding box of every record, read from the record headers at
+    # the offsets listed in the .shx index without decoding any geometry.
+    with open(os.path.splitext(shp_path)[0] + '.shx', 'rb') as f:
+        f.seek(100)
+        offsets = np.frombuffer(f.read(), dtype='>i4').reshape(-1, 2)[:, 0] * 2
+    shp = np.memmap(shp_path, dtype='u1', mode='r')
+    raw = shp[(offsets + 12)[:, None] + np.arange(32)]
+    return np.ascontiguousarray(raw).view('<f8').reshape(-1, 4)
+
+
+def record_boxes(shp_path):
+    sbn = os.path.splitext(shp_path)[0] + '.sbn'
+    if os.path.exists(sbn):
+        try:
+            return _sbn_boxes(sbn)
+        except (ValueError, struct.error):
+            pass
+    return _shx_boxes(shp_path)
+
+
+def _lines(geometry):
+    if geometry.is_empty:
+        return []
+    if isinstance(geometry, LineString):
+        return [np.asarray(geometry.coords)]
+    if isinstance(geometry, MultiLineString):
+        return [np.asarray(line.coords) for line in geometry.geoms]
+    if hasattr(geometry, 'geoms'):
+        return [line for part in geometry.geoms for line in _lines(part)]
+    return []
+
+
+def build(extent, path, tolerance=0., shp_path=COUNTY_SHP):
+    # Clip (and optionally simplify) the records touching `extent` and save
+    # them as float32 coordinates with part offsets.
+    west, east, south, north = extent
+    clip = box(west, south, east, north)
+    boxes = record_boxes(shp_path)
+    hits = np.nonzero((boxes[:, 0] <= east) & (boxes[:, 2] >= west) &
+                      (boxes[:, 1] <= north) & (boxes[:, 3] >= south))[0]
+
+    reader = shapefile.Reader(shp_path)
+    coords, parts, geoms = [], [0], [0]
+    for i in hits:
+        geometry = reader.shape(int(i)).__geo_interface__
+        if geometry['type'] == 'LineString':
+            geometry = LineString(geometry['coordinates'])
+        else:
+            geometry = MultiLineString(geometry['coordinates'])
+        geometry = geometry.intersection(clip)
+        if tolerance:
+            geometry = geometry.simplify(tolerance, preserve_topology=False)
+        lines = [line for line in _lines(geometry) if len(line) > 1]
+        if not lines:
+            continue
+        for line in lines:
+            coords.append(line[:, :2])
+            parts.append(parts[-1] + len(line))
+        geoms.append(len(parts) - 1)
+
+    coords = np.concatenate(coords) if coords else np.empty((0, 2))
+    tmp = path + '.%d.npz' % os.getpid()
+    np.savez(tmp, coords=coords.astype(np.float32),
+             parts=np.asarray(parts, dtype=np.int32),
+             geoms=np.asarray(geoms, dtype=np.int32))
+    os.replace(tmp, path)
+
+
+class CountyStore(object):
+    # Clipped county lines for one map extent with an STRtree for bbox queries.
+
+    def __init__(self, path):
+        with np.load(path) as data:
+            coords, parts, geoms = data['coords'], data['parts'], data['geoms']
+        lines = [coords[parts[i]:parts[i + 1]] for i in range(len(parts) - 1)]
+        self.geometries = [MultiLineString(lines[geoms[i]:geoms[i + 1]])
+                           for i in range(len(geoms) - 1)]
+        self.tree = STRtree(self.geometries)
+
+    def query(self, west, east, south, north):
+        hits = self.tree.query(box(west, south, east, north))
+        if len(hits) and not hasattr(hits[0], 'geom_type'):
+            hits = [self.geometries[i] for i in hits]
+        return list(hits)
+
+    def feature(self):
+        return cfeature.ShapelyFeature(self.geometries, ccrs.PlateCarree())
+
+
+def load(extent, tolerance=0., pad=1., shp_path=COUNTY_SHP):
+    # County lines for a map extent [west, east, south, north], built on
+    # first use. `pad` degrees cover the corners of conic maps.
+    west, east, south, north = extent
+    extent = (west - pad, east + pad, south - pad, north + pad)
+    key = hashlib.sha256(repr((os.path.abspath(shp_path), np.round(extent, 4).tolist(),
+                               tolerance)).encode()).hexdigest()
+    if key not in _stores:
+        path = os.path.join(COUNTY_DIR, key + '.npz')
+        if not os.path.exists(path):
+            os.makedirs(COUNTY_DIR, exist_ok=True)
+            build(extent, path, tolerance, shp_path)
+        _stores[key] = CountyStore(path)
+    return _stores[key]
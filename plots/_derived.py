@@ -0,0 +1,119 @@
+import metpy.calc as mpcalc
+
+import _metrics
+import _rap
+
+# Derived field name -> (function, inputs). Each input is one of:
+#   a RAP variable, smoothed, on the level being derived;
+#   a (variable, level) pair, smoothed, on that fixed level;
+#   another derived field on the same level;
+#   GRID, the grid spacing (dx, dy) from the lon/lat of the fetch.
+NODES = {}
+GRID = 'grid_deltas'
+
+# Lower level for thickness, in hPa.
+THICKNESS_BASE = 1000
+
+# Derived fields each product draws, as (name, level).
+PRODUCTS = {
+    '500MB_WIND': [('wind_speed', 500)],
+    '850MB_WIND': [('wind_speed', 850)],
+}
+
+
+def node(name, *inputs):
+    # Declare a derived field computed by the decorated function from
+    # `inputs`, in order.
+    def register(func):
+        NODES[name] = (func, inputs)
+        return func
+    return register
+
+
+@node('wind_speed', _rap.UWND, _rap.VWND)
+def wind_speed(u, v):
+    return mpcalc.wind_speed(u, v)
+
+
+@node('vorticity', _rap.UWND, _rap.VWND, GRID)
+def vorticity(u, v, deltas):
+    return mpcalc.vorticity(u, v, dx=deltas[0], dy=deltas[1])
+
+
+@node('divergence', _rap.UWND, _rap.VWND, GRID)
+def divergence(u, v, deltas):
+    return mpcalc.divergence(u, v, dx=deltas[0], dy=deltas[1])
+
+
+@node('temp_advection', _rap.TEMP, _rap.UWND, _rap.VWND, GRID)
+def temp_advection(temp, u, v, deltas):
+    return mpcalc.advection(temp, u=u, v=v, dx=deltas[0], dy=deltas[1])
+
+
+@node('thickness', _rap.HGHT, (_rap.HGHT, THICKNESS_BASE))
+def thickness(top, bottom):
+    return top - bottom
+
+
+def fields(name, level):
+    # The (variable, level) pairs a derived field is computed from, through
+    # any derived fields it depends on.
+    wanted = set()
+    for item in NODES[name][1]:
+        if item == GRID:
+            continue
+        if item in NODES:
+            wanted.update(fields(item, level))
+        elif isinstance(item, tuple):
+            wanted.add(item)
+        else:
+            wanted.add((item, level))
+    return wanted
+
+
+def product_fields(products):
+    # The fetched fields behind every derived field the named products draw.
+    wanted = set()
+    for product in products:
+        for name, level in PRODUCTS.get(product, []):
+            wanted.update(fields(name, level))
+    return wanted
+
+
+def get(upper, name, level, sigma=2):
+    # A derived field on a level of `upper`, computed from the fields
+    # smoothed with `sigma`. Each field is computed once per UpperAir, level
+    # and sigma, along with whatever it depends on, and kept on `upper` for
+    # every product that asks after it.
+    key = (name, level, sigma)
+    if key not in upper.derived:
+        if name == GRID:
+            upper.derived[key] = mpcalc.lat_lon_grid_deltas(upper.lon, upper.lat)
+        else:
+            func, inputs = NODES[name]
+            upper.derived[key] = func(*[_input(upper, name, item, level, sigma)
+                                        for item in inputs])
+    return upper.derived[key]
+
+
+def _input(upper, name, item, level, sigma):
+    if item == GRID:
+        return get(upper, GRID, None, None)
+    if item in NODES:
+        return get(upper, item, level, sigma)
+    at = level
+    if isinstance(item, tuple):
+        item, at = item
+    if (item, at) not in upper.fields:
+        raise LookupError('%s at %g hPa needs %s at %g hPa, which was not fetched'
+                          % (name, level, item, at))
+    return upper.smoothed(at, sigma)[item]
+
+
+@_metrics.stage('derive')
+def prepare(upper, products, sigma=2):
+    # Compute every derived field the named products draw, e.g. before
+    # render workers fork so they all share one copy.
+    for product in products:
+        for name, level in PRODUCTS.get(product, []):
+            get(upper, name, level, sigma)
@@ -0,0 +1,54 @@
+import cartopy.crs as ccrs
+
+import _rap
+
+
+class Domain(object):
+    # A named map: its lon/lat extent, Lambert conformal projection and the
+    # RAP bounding box (0-360 longitudes) that covers it.
+
+    def __init__(self, name, extent, central_longitude, box, central_latitude=35,
+                 standard_parallels=(30, 60)):
+        self.name = name
+        self.extent = extent
+        self.central_longitude = central_longitude
+        self.central_latitude = central_latitude
+        self.standard_parallels = standard_parallels
+        self.box = box
+
+    def projection(self):
+        return ccrs.LambertConformal(central_latitude=self.central_latitude,
+                                     central_longitude=self.central_longitude,
+                                     standard_parallels=self.standard_parallels)
+
+
+DOMAINS = {
+    'conus': Domain('conus', [-125, -89, 25, 50], -101, _rap.CONUS_BOX),
+    'fa': Domain('fa', [-104.1, -95.5, 32.1, 39.1], -98,
+                 dict(north=42, south=29, east=267, west=253)),
+    'plains': Domain('plains', [-109.1, -90.5, 28.1, 43.1], -97.5,
+                     dict(north=46, south=25, east=273, west=247)),
+}
+
+# Domain the product scripts draw when none is named.
+DEFAULT = 'conus'
+
+
+def get(name):
+    return DOMAINS[name]
+
+
+def box(names):
+    # The smallest bounding box covering every named domain, so one fetch
+    # serves them all.
+    boxes = [DOMAINS[name].box for name in names]
+    return dict(north=max(b['north'] for b in boxes), south=min(b['south'] for b in boxes),
+                east=max(b['east'] for b in boxes), west=min(b['west'] for b in boxes))
+
+
+def image_path(product, domain, directory='./images'):
+    # Output file for a product on a domain. The default domain keeps the
+    # existing file names.
+    if domain == DEFAULT:
+        return '%s/%s.png' % (directory, product)
+    return '%s/%s_%s.png' % (directory, product, domain.upper())
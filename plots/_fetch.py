@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from siphon.http_util import session_manager
+
+# Most requests a product may have in flight at once.
+MAX_WORKERS = int(os.environ.get('PLOTS_FETCH_WORKERS', '8'))
+
+# siphon opens a new HTTP session for every catalog and endpoint; hand out
+# one shared session instead so concurrent requests reuse connections.
+_session = None
+_session_lock = threading.Lock()
+
+
+class _SharedSession(requests.Session):
+    # TDSCatalog closes its session when it is garbage collected, which would
+    # drop the connection pools under every fetch still using this one.
+
+    def close(self):
+        pass
+
+
+def _shared_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Set up as siphon's own sessions are.
+            _session = _SharedSession()
+            _session.headers['User-Agent'] = session_manager.user_agent
+            for name, value in session_manager.options.items():
+                setattr(_session, name, value)
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+    return _session
+
+
+session_manager.create_session = _shared_session
+
+
+def gather(*calls):
+    # Run independent fetches at once and return their results in order, so
+    # the wait is the slowest request rather than the sum of them. Each call
+    # is a callable or a (callable, arg, ...) tuple.
+    calls = [call if isinstance(call, tuple) else (call,) for call in calls]
+    if len(calls) == 1:
+        return [calls[0][0](*calls[0][1:])]
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(calls)))) as pool:
+        futures = [pool.submit(call[0], *call[1:]) for call in calls]
+        return [future.result() for future in futures]
@@ -0,0 +1,261 @@
+from datetime import datetime
+import hashlib
+import os
+
+import cartopy.crs as ccrs
+import matplotlib.pyplot as plt
+import numpy as np
+import xarray as xr
+
+import _config
+import _metrics
+import _transform
+
+# Resampling tables from the satellite grid onto our maps.
+RESAMPLE_DIR = os.path.join(_config.CACHE_DIR, 'goes')
+
+# Tables already loaded by this process.
+_tables = {}
+
+# Grey-level and colour tables already built by this process.
+_gammas = {}
+_colours = {}
+
+
+class VisibleImage(object):
+    # A GOES image cut to a map: pixel values with their fixed-grid x/y
+    # coordinates, the satellite projection and the scan start time. Packed
+    # data stays as stored counts; `scale`, `offset` and `fill` decode them.
+
+    def __init__(self, data, x, y, crs, start, scale=1., offset=0., fill=None):
+        self.data = data
+        self.x = x
+        self.y = y
+        self.crs = crs
+        self.start = start
+        self.scale = scale
+        self.offset = offset
+        self.fill = fill
+
+    @property
+    def extent(self):
+        # imshow extent for origin='upper'.
+        return (self.x[0], self.x[-1], self.y[-1], self.y[0])
+
+    def levels(self, gamma=.5):
+        # Reflectance as uint8 grey levels, corrected by `gamma`.
+        if self.data.dtype.kind in 'iu':
+            table = gamma_table(self.data.dtype, self.scale, self.offset, self.fill, gamma)
+            return table[self.data.view('u%d' % self.data.dtype.itemsize)]
+        reflectance = np.clip(self.data * self.scale + self.offset, 0, 1)
+        return np.round(255 * reflectance ** gamma).astype(np.uint8)
+
+
+def gamma_table(dtype, scale, offset, fill=None, gamma=.5):
+    # The uint8 grey level of every value an integer dtype can hold, so
+    # counts turn into grey levels with one lookup. Indexed by the counts'
+    # unsigned view.
+    dtype = np.dtype(dtype)
+    key = (dtype.str, scale, offset, fill, gamma)
+    if key not in _gammas:
+        unsigned = np.dtype('u%d' % dtype.itemsize)
+        counts = np.arange(2 ** (8 * dtype.itemsize), dtype=unsigned).view(dtype)
+        reflectance = np.clip(counts * scale + offset, 0, 1)
+        table = np.round(255 * reflectance ** gamma).astype(np.uint8)
+        if fill is not None:
+            table[np.array(fill, dtype=dtype).view(unsigned)] = 0
+        _gammas[key] = table
+    return _gammas[key]
+
+
+def colour_table(cmap):
+    # RGBA for each of the 256 grey levels.
+    name = getattr(cmap, 'name', cmap)
+    if name not in _colours:
+        _colours[name] = plt.get_cmap(cmap)(np.arange(256), bytes=True)
+    return _colours[name]
+
+
+def extent_bounds(crs, extent, samples=50):
+    # Bounds of a lon/lat map extent in another projection, sampled along
+    # the edges since straight lines in one are curves in the other.
+    west, east, south, north = extent
+    t = np.linspace(0, 1, samples)
+    lons = np.concatenate([west + (east - west) * t, np.full(samples, east),
+                           east - (east - west) * t, np.full(samples, west)])
+    lats = np.concatenate([np.full(samples, south), south + (north - south) * t,
+                           np.full(samples, north), north - (north - south) * t])
+    xy = crs.transform_points(ccrs.PlateCarree(), lons, lats)[:, :2]
+    xy = xy[np.isfinite(xy).all(axis=1)]
+    return xy[:, 0].min(), xy[:, 0].max(), xy[:, 1].min(), xy[:, 1].max()
+
+
+def _index_range(coord, low, high):
+    # Index slice covering [low, high] on an ascending or descending axis,
+    # padded by a pixel.
+    coord = np.asarray(coord)
+    if coord[0] > coord[-1]:
+        start = len(coord) - np.searchsorted(coord[::-1], high, side='right')
+        stop = len(coord) - np.searchsorted(coord[::-1], low, side='left')
+    else:
+        start = np.searchsorted(coord, low, side='left')
+        stop = np.searchsorted(coord, high, side='right')
+    return max(0, start - 1), min(len(coord), stop + 1)
+
+
+def _coord(variable):
+    # Decoded 1-D coordinate from a dataset opened without decoding.
+    values = variable.values.astype(float)
+    return (values * variable.attrs.get('scale_factor', 1.) +
+            variable.attrs.get('add_offset', 0.))
+
+
+def _block_mean(counts, step, fill=None):
+    # Mean of every step x step block with an integer accumulator. Fill
+    # pixels are left out of the mean, and a block with nothing else stays
+    # fill.
+    ny = counts.shape[0] // step * step
+    nx = counts.shape[1] // step * step
+    blocks = counts[:ny, :nx].reshape(ny // step, step, nx // step, step)
+    accumulator = np.int64 if counts.dtype.kind == 'i' else np.uint64
+    if fill is None:
+        total = blocks.sum(axis=(1, 3), dtype=accumulator)
+        return (total // (step * step)).astype(counts.dtype)
+    valid = blocks != fill
+    total = np.where(valid, blocks, 0).sum(axis=(1, 3), dtype=accumulator)
+    n = valid.sum(axis=(1, 3))
+    mean = (total // np.maximum(n, 1).astype(accumulator)).astype(counts.dtype)
+    mean[n == 0] = fill
+    return mean
+
+
+@_metrics.stage('fetch')
+def load_visible(dataset, extent, pixels, method='mean', variable='Sectorized_CMI'):
+    # Load a GOES image from a catalog dataset, cut to the map extent and
+    # reduced to about `pixels` (width, height) before any data is read.
+    # `method` is 'stride' to read every n-th pixel, or 'mean' to
+    # block-average n x n pixels. The image stays as stored counts.
+    data = xr.open_dataset(dataset.access_urls['OPENDAP'], mask_and_scale=False)
+    image = data.metpy.parse_cf(variable)
+    crs = image.metpy.cartopy_crs
+    x = _coord(data['x'])
+    y = _coord(data['y'])
+
+    xmin, xmax, ymin, ymax = extent_bounds(crs, extent)
+    i0, i1 = _index_range(x, xmin, xmax)
+    j0, j1 = _index_range(y, ymin, ymax)
+
+    step = max(1, int(min((i1 - i0) / float(pixels[0]), (j1 - j0) / float(pixels[1]))))
+    if method == 'stride':
+        counts = image.isel(x=slice(i0, i1, step), y=slice(j0, j1, step)).values
+        x = x[i0:i1:step]
+        y = y[j0:j1:step]
+    else:
+        counts = image.isel(x=slice(i0, i1), y=slice(j0, j1)).values
+        x = x[i0:i1]
+        y = y[j0:j1]
+
+    # Counts stored signed are read as unsigned, with the fill value to
+    # match, before any averaging.
+    attrs = image.attrs
+    fill = attrs.get('_FillValue')
+    if str(attrs.get('_Unsigned', '')).lower() == 'true' and counts.dtype.kind == 'i':
+        unsigned = 'u%d' % counts.dtype.itemsize
+        if fill is not None:
+            fill = np.array(fill, dtype=counts.dtype).view(unsigned)
+        counts = counts.view(unsigned)
+    elif fill is not None:
+        fill = np.array(fill, dtype=counts.dtype)
+
+    if method != 'stride' and step > 1:
+        counts = _block_mean(counts, step, fill)
+        x = x[:len(x) // step * step].reshape(-1, step).mean(axis=1)
+        y = y[:len(y) // step * step].reshape(-1, step).mean(axis=1)
+
+    start = datetime.strptime(data.start_date_time, '%Y%j%H%M%S')
+    return VisibleImage(counts, x, y, crs, start, attrs.get('scale_factor', 1.),
+                        attrs.get('add_offset', 0.), None if fill is None else int(fill))
+
+
+class Resampler(object):
+    # Nearest-pixel lookup from a satellite grid onto the pixels of a map:
+    # the flat source index of every output pixel, or -1 off the image.
+
+    def __init__(self, index, shape):
+        self.index = index
+        self.shape = shape
+        self._outside = index < 0
+        self._source = np.where(self._outside, 0, index)
+
+    def __call__(self, data, fill=np.nan):
+        # Reproject one frame with a single gather.
+        out = np.asarray(data).ravel()[self._source]
+        if self._outside.any():
+            out = out.astype(np.result_type(out, fill))
+            out[self._outside] = fill
+        return out.reshape(self.shape)
+
+
+def _grid(coord):
+    return [float(coord[0]), float(coord[1] - coord[0]), len(coord)]
+
+
+def _build(image, projection, extent, shape):
+    # Centres of the output pixels, top row first, found on the satellite
+    # grid.
+    height, width = shape
+    x0, x1, y0, y1 = extent
+    tx = x0 + (np.arange(width) + .5) * (x1 - x0) / width
+    ty = y1 - (np.arange(height) + .5) * (y1 - y0) / height
+    tx, ty = np.meshgrid(tx, ty)
+    src = image.crs.transform_points(projection, tx, ty)
+
+    nx, ny = len(image.x), len(image.y)
+    with np.errstate(invalid='ignore'):
+        col = np.round((src[..., 0] - image.x[0]) / (image.x[1] - image.x[0]))
+        row = np.round((src[..., 1] - image.y[0]) / (image.y[1] - image.y[0]))
+        inside = (np.isfinite(col) & np.isfinite(row) &
+                  (col >= 0) & (col < nx) & (row >= 0) & (row < ny))
+    index = np.where(inside, row * nx + col, -1)
+    return index.astype(np.int32).ravel()
+
+
+def resampler(image, projection, extent, shape, sector='CONUS'):
+    # The lookup table from an image's grid onto a map extent (in map
+    # coordinates) drawn at `shape` pixels. Built once and kept on disk.
+    parts = [sector, _grid(image.x), _grid(image.y), projection.proj4_init,
+             np.round(extent, 3).tolist(), list(shape)]
+    key = hashlib.sha256(repr(parts).encode()).hexdigest()
+    if key not in _tables:
+        path = os.path.join(RESAMPLE_DIR, key + '.npy')
+        if os.path.exists(path):
+            index = np.load(path)
+        else:
+            index = _build(image, projection, extent, shape)
+            os.makedirs(RESAMPLE_DIR, exist_ok=True)
+            tmp = path + '.%d.npy' % os.getpid()
+            np.save(tmp, index)
+            os.replace(tmp, path)
+        _tables[key] = Resampler(index, tuple(shape))
+    return _tables[key]
+
+
+@_metrics.stage('resample')
+def add_image(ax, image, data=None, dpi=300, sector='CONUS', **kwargs):
+    # Draw a satellite image (or `data` on its grid) on a map whose extent
+    # is already set, already reprojected so cartopy doesn't warp it. uint8
+    # grey levels go out as RGBA through the colormap's colour table, off
+    # the image left transparent.
+    extent = ax.get_extent()
+    table = resampler(image, ax.projection, extent, _transform.output_shape(ax, dpi), sector)
+    data = image.data if data is None else data
+    if np.asarray(data).dtype == np.uint8:
+        pixels = colour_table(kwargs.pop('cmap', 'Greys_r'))[table(data, fill=0)]
+        pixels.reshape(-1, 4)[table._outside, 3] = 0
+    else:
+        pixels = table(data)
+    kwargs.setdefault('interpolation', 'nearest')
+    result = ax.imshow(pixels, extent=extent, origin='upper', transform=ax.projection,
+                       **kwargs)
+    ax.set_extent(extent, crs=ax.projection)
+    return result
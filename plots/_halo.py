@@ -0,0 +1,37 @@
+from matplotlib.collections import Collection
+import matplotlib.patheffects as PathEffects
+
+import _labels
+import _metrics
+
+
+def _stroke(width, colour):
+    # Draw a wider line in `colour` under the artist's own.
+    return [PathEffects.Stroke(linewidth=width, foreground=colour), PathEffects.Normal()]
+
+
+@_metrics.stage('contour')
+def contour(ax, x, y, z, levels=None, color='white', linewidth=.5, halo='black',
+            halo_width=1.5, zorder=100, **kwargs):
+    # Trace the contours once and draw every line over a wider halo.
+    args = (x, y, z) if levels is None else (x, y, z, levels)
+    cs = ax.contour(*args, colors=color, linewidths=linewidth, zorder=zorder, **kwargs)
+    # Older matplotlib keeps one collection per level.
+    for artist in [cs] if isinstance(cs, Collection) else cs.collections:
+        artist.set_path_effects(_stroke(halo_width, halo))
+    return cs
+
+
+def clabel(ax, cs, fontsize=6, color='white', halo='black', halo_width=1.5, **kwargs):
+    # Label the contours once, upright and haloed.
+    return _labels.label(ax, cs, fontsize=fontsize, color=color, halo=halo,
+                         halo_width=halo_width, **kwargs)
+
+
+@_metrics.stage('barbs')
+def barbs(ax, x, y, u, v, color='white', linewidth=.5, halo='black', halo_width=1.5,
+          zorder=103, **kwargs):
+    # Regrid and build the barbs once and draw them over a wider halo.
+    b = ax.barbs(x, y, u, v, color=color, linewidth=linewidth, zorder=zorder, **kwargs)
+    b.set_path_effects(_stroke(halo_width, halo))
+    return b
@@ -0,0 +1,131 @@
+from matplotlib.collections import Collection
+import matplotlib.patheffects as PathEffects
+from matplotlib.path import Path
+import numpy as np
+
+import _metrics
+
+
+def _artists(cs):
+    # Older matplotlib keeps one collection per level.
+    return [cs] if isinstance(cs, Collection) else cs.collections
+
+
+def _segments(cs):
+    # Every contour line as (level index, vertices), in data coordinates.
+    return [(i, np.asarray(seg)) for i, segs in enumerate(cs.allsegs)
+            for seg in segs if len(seg) > 1]
+
+
+def _candidates(points, starts, ends, step, min_length):
+    # Evenly spaced spots along each line at least `min_length` long, found
+    # with one interpolation over all lines joined end to end.
+    gap = np.zeros(len(points))
+    gap[1:] = np.hypot(*np.diff(points, axis=0).T)
+    gap[starts] = 0
+    arc = np.cumsum(gap)
+    length = arc[ends] - arc[starts]
+
+    count = np.where(length >= min_length, np.floor(length / step), 0).astype(int)
+    count[(length >= min_length) & (count == 0)] = 1
+    line = np.repeat(np.arange(len(starts)), count)
+    nth = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    along = (nth + .5) * (length / np.maximum(count, 1))[line]
+
+    # Lines are joined, so step each one past the previous before
+    # interpolating.
+    offset = np.cumsum(np.concatenate([[0], length[:-1] + 1]))
+    joined = np.repeat(offset - arc[starts], ends - starts + 1) + arc
+    where = offset[line] + along
+    x = np.interp(where, joined, points[:, 0])
+    y = np.interp(where, joined, points[:, 1])
+    return line, x, y
+
+
+def _cut(segments, display, boxes):
+    # Drop the vertices under the labels, splitting the lines around them.
+    pieces = {}
+    for (i, seg), (_, xy) in zip(segments, display):
+        inside = ((xy[:, None, 0] > boxes[:, 0]) & (xy[:, None, 0] < boxes[:, 2]) &
+                  (xy[:, None, 1] > boxes[:, 1]) & (xy[:, None, 1] < boxes[:, 3])).any(axis=1)
+        runs = np.flatnonzero(np.diff(np.concatenate([[True], inside, [True]]).astype(int)))
+        for start, stop in zip(runs[::2], runs[1::2]):
+            if stop - start > 1:
+                pieces.setdefault(i, []).append(seg[start:stop])
+    return pieces
+
+
+def _set_paths(cs, pieces):
+    empty = Path(np.empty((0, 2)))
+    if isinstance(cs, Collection):
+        cs.set_paths([Path.make_compound_path(*[Path(p) for p in pieces[i]])
+                      if i in pieces else empty for i in range(len(cs.levels))])
+    else:
+        for i, collection in enumerate(cs.collections):
+            collection.set_paths([Path(p) for p in pieces.get(i, [])])
+
+
+@_metrics.stage('labels')
+def label(ax, cs, fontsize=6, color='white', fmt='%i', spacing=120, halo=None,
+          halo_width=1.5, inline=True, pad=1):
+    # Place upright contour labels at least about `spacing` points apart.
+    # Candidate spots every quarter spacing along every line are bucketed
+    # into spacing-sized cells and each cell keeps its spot nearest the
+    # centre, so placement is vectorized and repeatable. With `inline` the
+    # lines are cut where labels sit.
+    segments = _segments(cs)
+    if not segments:
+        return []
+
+    ax.apply_aspect()
+    transform = cs.get_transform()
+    display = [(i, transform.transform(seg)) for i, seg in segments]
+    points = np.concatenate([d for _, d in display])
+    sizes = np.array([len(d) for _, d in display])
+    ends = np.cumsum(sizes) - 1
+    starts = ends - sizes + 1
+
+    # Label sizes in pixels, allowing about 0.6 em per character.
+    px = ax.figure.dpi / 72.
+    texts = [fmt % level for level in cs.levels]
+    widths = np.array([.6 * fontsize * len(text) for text in texts]) * px
+    height = fontsize * px
+    cell = spacing * px
+
+    line, x, y = _candidates(points, starts, ends, cell / 4., widths.max() * 1.5)
+    level = np.array([i for i, _ in display])[line]
+
+    # Keep labels whole inside the map.
+    x0, y0, x1, y1 = ax.bbox.extents
+    half = widths[level] / 2 + pad * px
+    ok = ((x - half > x0) & (x + half < x1) &
+          (y - height / 2 > y0) & (y + height / 2 < y1))
+    line, x, y, level = line[ok], x[ok], y[ok], level[ok]
+
+    # One label per cell, the candidate closest to the cell centre, and only
+    # if it is well inside the cell so neighbours never touch.
+    col = np.floor((x - x0) / cell)
+    row = np.floor((y - y0) / cell)
+    dist = np.hypot(x - x0 - (col + .5) * cell, y - y0 - (row + .5) * cell)
+    cell_id = row * (np.ceil((x1 - x0) / cell) + 1) + col
+    near = dist < .35 * cell
+    order = np.lexsort((dist[near], cell_id[near]))
+    _, first = np.unique(cell_id[near][order], return_index=True)
+    chosen = np.flatnonzero(near)[order[first]]
+    x, y, level = x[chosen], y[chosen], level[chosen]
+
+    if inline and len(chosen):
+        half = widths[level] / 2 + pad * px
+        boxes = np.column_stack([x - half, y - height / 2 - pad * px,
+                                 x + half, y + height / 2 + pad * px])
+        _set_paths(cs, _cut(segments, display, boxes))
+
+    effects = None
+    if halo is not None:
+        effects = [PathEffects.withStroke(linewidth=halo_width, foreground=halo)]
+    zorder = _artists(cs)[0].get_zorder() + 2
+    xy = ax.transData.inverted().transform(np.column_stack([x, y]))
+    return [ax.text(lx, ly, texts[i], fontsize=fontsize, color=color, ha='center',
+                    va='center', zorder=zorder, clip_on=True, transform=ax.transData,
+                    path_effects=effects)
+            for (lx, ly), i in zip(xy, level)]
@@ -0,0 +1,251 @@
+import atexit
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+import _config
+
+# Where stage records and metrics files go, set with PLOTS_METRICS_DIR
+# (e.g. a node_exporter textfile directory). Nothing is recorded unless
+# PLOTS_METRICS=1.
+METRICS_DIR = os.environ.get('PLOTS_METRICS_DIR', os.path.join(_config.CACHE_DIR, 'metrics'))
+ENABLED = _config.flag('PLOTS_METRICS')
+
+# Profile one product (by name, e.g. c500anl) with cProfile and
+# tracemalloc, set with PLOTS_PROFILE. Needs PLOTS_METRICS too.
+PROFILE = os.environ.get('PLOTS_PROFILE')
+
+# One JSON line per finished stage, from every product. Past MAX_BYTES the
+# file moves to stages.jsonl.1, replacing the one before.
+STAGES = os.path.join(METRICS_DIR, 'stages.jsonl')
+MAX_BYTES = int(os.environ.get('PLOTS_METRICS_MB', '16')) * 1024 * 1024
+
+# How often the resident set size is sampled while stages run.
+SAMPLE_SECONDS = .01
+
+_lock = threading.Lock()
+
+# The product being built in this process: its labels, when it started,
+# its per-stage totals and, when asked for, its profiler.
+_run = None
+
+# Highest RSS sampled so far for each running stage, and the process the
+# sampler thread belongs to (threads do not survive a fork).
+_active = {}
+_sampler_pid = None
+
+
+def _rss():
+    # Current resident set size in bytes. Without /proc, the process's
+    # high-water mark is the best there is.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _sample():
+    while True:
+        time.sleep(SAMPLE_SECONDS)
+        if _active:
+            rss = _rss()
+            with _lock:
+                for key in _active:
+                    _active[key] = max(_active[key], rss)
+
+
+def _start_sampler():
+    global _sampler_pid
+    with _lock:
+        if _sampler_pid != os.getpid():
+            _sampler_pid = os.getpid()
+            threading.Thread(target=_sample, name='metrics-rss', daemon=True).start()
+
+
+def _after_fork():
+    # The sampler may have held the lock when the process forked.
+    global _lock
+    _lock = threading.Lock()
+    _active.clear()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def _labels():
+    labels = {'product': _run['product']}
+    labels.update(_run['labels'])
+    return labels
+
+
+def _name():
+    # File name for this product's metrics, e.g. c500anl_fa.
+    return '_'.join([_run['product']] + [str(v) for _, v in sorted(_run['labels'].items())])
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '%s.%d.%d' % (path, os.getpid(), threading.get_ident())
+    with open(tmp, 'w') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def _append(path, line):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        if os.path.getsize(path) > MAX_BYTES:
+            os.replace(path, path + '.1')
+    except OSError:
+        pass
+    # One write per line, so lines from concurrent processes never mix.
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode())
+    finally:
+        os.close(fd)
+
+
+def _record(stage, wall, cpu, peak, growth):
+    with _lock:
+        totals = _run['stages'].setdefault(stage, [0, 0., 0., 0, 0])
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += cpu
+        totals[3] = max(totals[3], peak)
+        totals[4] += growth
+        line = dict(_labels(), stage=stage, wall=round(wall, 4), cpu=round(cpu, 4),
+                    peak_rss=peak, rss_growth=growth, pid=os.getpid(),
+                    time=datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'))
+        _append(STAGES, json.dumps(line, sort_keys=True) + '\n')
+
+
+def _tags(labels):
+    return ','.join('%s="%s"' % item for item in sorted(labels.items()))
+
+
+def _prometheus():
+    # The product's stage totals in the Prometheus text format.
+    labels = _labels()
+    lines = []
+    for metric, index, text in (
+            ('plots_stage_calls', 0, 'Times the stage ran in the last build.'),
+            ('plots_stage_wall_seconds', 1, 'Wall time spent in the stage.'),
+            ('plots_stage_cpu_seconds', 2, 'CPU time spent in the stage.'),
+            ('plots_stage_peak_rss_bytes', 3, 'Highest RSS seen while the stage ran.'),
+            ('plots_stage_rss_growth_bytes', 4, 'RSS at the end of the stage less RSS at '
+                                                'its start.')):
+        lines.append('# HELP %s %s' % (metric, text))
+        lines.append('# TYPE %s gauge' % metric)
+        for stage, totals in sorted(_run['stages'].items()):
+            lines.append('%s{%s} %s' % (metric, _tags(dict(labels, stage=stage)),
+                                        round(totals[index], 4)))
+    lines.append('# HELP plots_last_build_timestamp_seconds When the product was last built.')
+    lines.append('# TYPE plots_last_build_timestamp_seconds gauge')
+    lines.append('plots_last_build_timestamp_seconds{%s} %d' % (_tags(labels), time.time()))
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def stage(name):
+    # Time a pipeline stage of the current product: wall time, CPU time, the
+    # highest RSS sampled while it runs and how much RSS it leaves behind.
+    # Works as a decorator too. CPU time and RSS are the whole process's, so
+    # stages that overlap in threads share them.
+    if _run is None:
+        yield
+        return
+    _start_sampler()
+    key = object()
+    rss = _rss()
+    with _lock:
+        _active[key] = rss
+    wall, cpu = time.time(), time.process_time()
+    try:
+        yield
+    finally:
+        wall, cpu, end = time.time() - wall, time.process_time() - cpu, _rss()
+        with _lock:
+            peak = max(_active.pop(key, rss), end)
+        _record(name, wall, cpu, peak, end - rss)
+
+
+def begin(product=None, **labels):
+    # Start timing a product. Defaults to the running script's name. Does
+    # nothing unless metrics are on.
+    global _run
+    if not ENABLED:
+        return
+    if product is None:
+        product = os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0]
+    _run = {'product': product, 'labels': labels, 'stages': {}, 'rss': _rss(),
+            'wall': time.time(), 'cpu': time.process_time(), 'profiler': None}
+    if PROFILE == product:
+        tracemalloc.start(25)
+        _run['profiler'] = cProfile.Profile()
+        _run['profiler'].enable()
+
+
+def end():
+    # Record the product's total and write its metrics file, and its
+    # profile when one was taken. Returns the per-stage totals, as
+    # stage -> [calls, wall, cpu, peak RSS, RSS growth]. Safe to call more
+    # than once.
+    global _run
+    run = _run
+    if run is None:
+        return {}
+    try:
+        rss = _rss()
+        peak = max([rss] + [totals[3] for totals in run['stages'].values()])
+        _record('total', time.time() - run['wall'], time.process_time() - run['cpu'], peak,
+                rss - run['rss'])
+        base = os.path.join(METRICS_DIR, _name())
+        _write(base + '.prom', _prometheus())
+
+        if run['profiler'] is not None:
+            run['profiler'].disable()
+            run['profiler'].dump_stats(base + '.prof')
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            top = snapshot.statistics('lineno')[:25]
+            _write(base + '.alloc.txt',
+                   'Python heap: %.1f MB now, %.1f MB peak\n\n' % (current / 1e6, peak / 1e6) +
+                   ''.join('%s\n' % stat for stat in top))
+            print('profile of %s in %s.prof and %s.alloc.txt' % (run['product'], base, base),
+                  file=sys.stderr)
+        return run['stages']
+    finally:
+        _run = None
+
+
+@contextmanager
+def product(name, **labels):
+    # Time one product built inside a longer-running process, then go back
+    # to timing the process itself. Yields the product's per-stage totals,
+    # complete once the block exits.
+    global _run
+    outer = _run
+    begin(name, **labels)
+    stages = _run['stages'] if _run is not None else {}
+    try:
+        yield stages
+    finally:
+        end()
+        _run = outer
+
+
+# With metrics on, every script is a product of its own unless it says
+# otherwise.
+begin()
+atexit.register(end)
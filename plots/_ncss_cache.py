@@ -0,0 +1,154 @@
+from datetime import timedelta
+import hashlib
+import json
+import os
+import threading
+
+from netCDF4 import Dataset
+from siphon.catalog import TDSCatalog
+
+import _config
+import _fetch  # shares one HTTP session across siphon requests
+import _metrics
+
+# Where NCSS subsets are kept, and how large the cache may grow.
+NCSS_DIR = os.path.join(_config.CACHE_DIR, 'ncss')
+MAX_BYTES = int(os.environ.get('PLOTS_CACHE_MB', '2048')) * 1024 * 1024
+
+# Serve everything from the cache and never touch the network.
+REPLAY = _config.flag('PLOTS_REPLAY')
+
+# Latest run and NCSS endpoint per catalog, looked up once per process.
+_runs = {}
+_runs_lock = threading.Lock()
+_url_locks = {}
+
+
+def _tmp(path):
+    # Per-process, per-thread scratch name for atomic writes.
+    return '%s.%d.%d' % (path, os.getpid(), threading.get_ident())
+
+
+def _runs_path():
+    return os.path.join(NCSS_DIR, 'runs.json')
+
+
+def _load_runs():
+    try:
+        with open(_runs_path()) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def _save_run(url, run):
+    runs = _load_runs()
+    runs[url] = run
+    tmp = _tmp(_runs_path())
+    with open(tmp, 'w') as f:
+        json.dump(runs, f, indent=1, sort_keys=True)
+    os.replace(tmp, _runs_path())
+
+
+def latest_run(url):
+    # Name of the newest dataset in a catalog (it carries the model run) and
+    # its NCSS endpoint. Replay mode uses the last run seen online.
+    with _runs_lock:
+        lock = _url_locks.setdefault(url, threading.Lock())
+    with lock:
+        if url not in _runs:
+            if REPLAY:
+                runs = _load_runs()
+                if url not in runs:
+                    raise LookupError('No recorded run for %s' % url)
+                _runs[url] = (runs[url], None)
+            else:
+                dataset = TDSCatalog(_config.thredds(url)).datasets[0]
+                os.makedirs(NCSS_DIR, exist_ok=True)
+                with _runs_lock:
+                    _save_run(url, dataset.name)
+                _runs[url] = (dataset.name, dataset.subset())
+    return _runs[url]
+
+
+def round_hour(time):
+    # Model output is hourly, so any time within the half hour picks the
+    # same output time on the server.
+    return (time + timedelta(minutes=30)).replace(minute=0, second=0,
+                                                  microsecond=0)
+
+
+def cache_key(run, variables, time, box, level=None):
+    key = {'run': run,
+           'variables': sorted(variables),
+           'time': time.strftime('%Y-%m-%dT%H:%M'),
+           'box': sorted(box.items()),
+           'level': level}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def evict(max_bytes=MAX_BYTES):
+    # Drop the least recently used subsets until the cache fits.
+    entries = []
+    for name in os.listdir(NCSS_DIR):
+        if name.endswith('.nc'):
+            path = os.path.join(NCSS_DIR, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+@_metrics.stage('decode')
+def _open(path):
+    # Opening reads and parses the subset's header and coordinates.
+    return Dataset(path)
+
+
+@_metrics.stage('fetch')
+def get_data(url, variables, time, box, level=None, run=None):
+    # Cached replacement for ncss.get_data() on the latest run of a catalog.
+    # The caller closes the returned Dataset (or uses it in a with block).
+    # `run` pins the run the caller resolved earlier; a process that sees a
+    # different latest run refuses rather than mixing runs.
+    latest, ncss = latest_run(url)
+    if run is not None and run != latest:
+        raise LookupError('Asked for run %s of %s, but %s is the run in use'
+                          % (run, url, latest))
+    run = latest
+    time = round_hour(time)
+    path = os.path.join(NCSS_DIR, cache_key(run, variables, time, box, level) + '.nc')
+
+    if os.path.exists(path):
+        os.utime(path, None)
+        return _open(path)
+    if REPLAY:
+        raise LookupError('No cached subset of %s for %s' % (run, ', '.join(variables)))
+
+    query = ncss.query()
+    query.variables(*variables)
+    query.add_lonlat()
+    if level is not None:
+        query.vertical_level(level)
+    query.time(time)
+    query.lonlat_box(**box)
+    raw = ncss.get_data_raw(query)
+
+    tmp = _tmp(path)
+    with open(tmp, 'wb') as f:
+        f.write(raw)
+    os.replace(tmp, path)
+    evict()
+
+    return _open(path)
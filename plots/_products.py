@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+import glob
+import json
+import os
+
+from siphon.catalog import TDSCatalog
+
+import _config
+import _fetch  # shares one HTTP session across siphon requests
+import _rap
+
+# The ./plots directory; scripts and outputs below are relative to it.
+PLOTS = os.path.dirname(os.path.abspath(__file__))
+
+# Catalogs polled for new data, as the scripts read them.
+HRRR_CATALOG = ('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+                'grib/NCEP/HRRR/CONUS_2p5km/latest.xml')
+GOES_CATALOG = ('https://thredds.ucar.edu/thredds/catalog/satellite'
+                '/goes/east/products/CloudAndMoistureImagery/CONUS/Channel02'
+                '/current/catalog.xml')
+GOES_TEST_CATALOG = ('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+                     'satellite/goes/east/products/CloudAndMoistureImagery/'
+                     'CONUS/Channel02/current/catalog.xml')
+
+# What each product was last built from, and what it wrote.
+MANIFEST = os.path.join(_config.CACHE_DIR, 'manifest.json')
+
+
+def model_version(url):
+    # A model input changes with a new run, or when the hour the scripts
+    # ask for (the current one, rounded as the NCSS cache rounds it) moves
+    # on within the same run.
+    run = TDSCatalog(_config.thredds(url)).datasets[0].name
+    return '%s@%s' % (run, (datetime.utcnow() + timedelta(minutes=30)).strftime('%Y%m%d%H'))
+
+
+def scan_version(url):
+    # Scan files are named by their start time, so the newest sorts last.
+    return max(TDSCatalog(_config.thredds(url)).datasets)
+
+
+def files_version(pattern):
+    # Local inputs change when any matching file does.
+    paths = sorted(glob.glob(os.path.join(PLOTS, pattern)))
+    return [[os.path.relpath(path, PLOTS), os.stat(path).st_mtime_ns, os.stat(path).st_size]
+            for path in paths]
+
+
+# Input name -> (function, argument) giving its current version.
+INPUTS = {
+    'rap': (model_version, _rap.RAP_CATALOG),
+    'hrrr': (model_version, HRRR_CATALOG),
+    'goes_visible': (scan_version, GOES_CATALOG),
+    'goes_visible_test': (scan_version, GOES_TEST_CATALOG),
+    'forecast_areas': (files_version, 'forecasts/files/conf/*'),
+}
+
+
+class Product(object):
+    # A script run from its own directory, the inputs it reads and the files
+    # it writes (relative to ./plots).
+
+    def __init__(self, script, inputs, outputs, args=()):
+        self.script = script
+        self.inputs = inputs
+        self.outputs = outputs
+        self.args = list(args)
+
+    def command(self):
+        return [os.path.basename(self.script)] + self.args
+
+    def directory(self):
+        return os.path.join(PLOTS, os.path.dirname(self.script))
+
+
+PRODUCTS = {
+    'rap_analysis': Product('anlGrid/renderAll.py', ['rap'],
+                            ['anlGrid/images/%s.png' % name
+                             for name in ('300MB', '500MB', '500MB_WIND', '500MB_TEMPS',
+                                          '850MB_WIND')]),
+    'rap_500mb_wind_forecast': Product('fcstGrid/f500wind.py', ['rap'],
+                                       ['fcstGrid/images/500MB_WIND.png'], ['0']),
+    'hrrr_surface_temp': Product('anlGrid/fhrrrsfctemp.py', ['hrrr'],
+                                 ['anlGrid/images/HRRRSFCTEMP.png']),
+    'visible': Product('sat/visFM.py', ['goes_visible'], ['sat/images/VISIBLE.png']),
+    'visible_loop': Product('sat/visLoop.py', ['goes_visible'],
+                            ['sat/images/VISIBLE_LOOP.gif']),
+    'visible_mslp': Product('obs/vis_ma.py', ['goes_visible_test', 'rap'],
+                            ['obs/images/VISIBLE.png']),
+    'day1_forecast': Product('forecasts/forecastMap.py', ['forecast_areas'],
+                             ['forecasts/images/DAY1_FORECAST.png']),
+}
+
+
+def poll(names):
+    # Current version of every named input, looked up concurrently. An input
+    # that cannot be reached maps to None.
+    def version(name):
+        func, arg = INPUTS[name]
+        try:
+            return func(arg)
+        except Exception as error:
+            print('could not poll %s: %s' % (name, error))
+            return None
+
+    names = sorted(names)
+    return dict(zip(names, _fetch.gather(*[(version, name) for name in names])))
+
+
+def output_state(product):
+    # Modification time and size of each output, or None when missing.
+    state = {}
+    for output in product.outputs:
+        try:
+            st = os.stat(os.path.join(PLOTS, output))
+            state[output] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            state[output] = None
+    return state
+
+
+def load_manifest():
+    try:
+        with open(MANIFEST) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_manifest(manifest):
+    os.makedirs(os.path.dirname(MANIFEST), exist_ok=True)
+    tmp = MANIFEST + '.%d' % os.getpid()
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp, MANIFEST)
+
+
+def stale(name, versions, manifest):
+    # Why a product needs rebuilding, or None when it is up to date. Products
+    # with an input that could not be polled are left alone.
+    product = PRODUCTS[name]
+    inputs = dict((i, versions[i]) for i in product.inputs)
+    if any(version is None for version in inputs.values()):
+        return None
+    entry = manifest.get(name)
+    if entry is None:
+        return 'never built'
+    changed = sorted(i for i in inputs if entry['inputs'].get(i) != inputs[i])
+    if changed:
+        return 'new ' + ', '.join(changed)
+    if any(state is None for state in output_state(product).values()):
+        return 'output missing'
+    return None
+
+
+def record(name, versions, manifest):
+    product = PRODUCTS[name]
+    manifest[name] = {'inputs': dict((i, versions[i]) for i in product.inputs),
+                      'outputs': output_state(product)}
@@ -0,0 +1,297 @@
+import cartopy.crs as ccrs
+from metpy.plots.mapping import CFProjection
+from netCDF4 import num2date
+import numpy as np
+from scipy.ndimage import map_coordinates
+
+import _archive
+import _fetch
+import _metrics
+import _ncss_cache
+import _smooth
+
+# Latest RAP run on the data server.
+RAP_CATALOG = ('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+               'grib/NCEP/RAP/CONUS_13km/latest.xml')
+
+# Bounding box shared by every CONUS upper-air product.
+CONUS_BOX = dict(north=55, south=20, east=281, west=230)
+
+# RAP isobaric variable names.
+HGHT = 'Geopotential_height_isobaric'
+UWND = 'u-component_of_wind_isobaric'
+VWND = 'v-component_of_wind_isobaric'
+TEMP = 'Temperature_isobaric'
+RELH = 'Relative_humidity_isobaric'
+
+# Units of each variable as the products use them.
+UNITS = {HGHT: 'meter', UWND: 'm/s', VWND: 'm/s', TEMP: 'kelvin', RELH: 'percent'}
+
+# Variables and isobaric level (hPa) read by each upper-air product.
+PRODUCTS = {
+    '300MB': ((HGHT, UWND, VWND), 300),
+    '500MB': ((HGHT, UWND, VWND), 500),
+    '500MB_WIND': ((HGHT, UWND, VWND), 500),
+    '500MB_TEMPS': ((HGHT, UWND, VWND, TEMP), 500),
+    '850MB_WIND': ((HGHT, UWND, VWND), 850),
+}
+
+# Results already fetched by this process.
+_fetched = []
+
+
+class UpperAir(object):
+    # Isobaric fields for one valid time, keyed by (variable, level in hPa).
+
+    def __init__(self, lon, lat, valid, time, box, url):
+        self.lon = lon
+        self.lat = lat
+        self.valid = valid
+        self.time = time
+        self.box = box
+        self.url = url
+        self.fields = {}
+        self.derived = {}
+        self._smoothed = {}
+
+    def field(self, variable, level):
+        return self.fields[(variable, level)]
+
+    def smoothed(self, level, sigma=2):
+        # Every field on a level, smoothed together once per sigma.
+        if (level, sigma) not in self._smoothed:
+            fields = dict((variable, (self.fields[(variable, lvl)], UNITS[variable]))
+                          for variable, lvl in self.fields if lvl == level)
+            self._smoothed[(level, sigma)] = _smooth.smooth(fields, sigma)
+        return self._smoothed[(level, sigma)]
+
+    def covers(self, wanted, time, box, url):
+        return (self.time == time and self.box == box and self.url == url
+                and all(key in self.fields for key in wanted))
+
+
+def product_fields(products):
+    # Collect the (variable, level) pairs needed by the named products,
+    # including the inputs of the derived fields they draw. _derived builds
+    # on this module, hence the import here.
+    import _derived
+    wanted = _derived.product_fields(products)
+    for name in products:
+        variables, level = PRODUCTS[name]
+        wanted.update((variable, level) for variable in variables)
+    return wanted
+
+
+def fetch_upper_air(products, time, box=CONUS_BOX, url=RAP_CATALOG, run=None):
+    wanted = product_fields(products)
+
+    # Reuse an earlier fetch when it already holds everything asked for.
+    for upper in _fetched:
+        if upper.covers(wanted, time, box, url):
+            return upper
+
+    # Group the variables by level so each level is a single NCSS query.
+    levels = {}
+    for variable, level in wanted:
+        levels.setdefault(level, set()).add(variable)
+
+    # Levels already in the local archive are memory-mapped from it; the rest
+    # are requested at once and archived for other products and processes.
+    levels = sorted((level, sorted(variables)) for level, variables in levels.items())
+    where = _archive.directory(url, time, box) if _archive.ENABLED else None
+    grid = _archive.load_grid(where)
+    if grid is not None:
+        missing = [(level, variables) for level, variables in levels
+                   if not all(_archive.has(where, variable, level) for variable in variables)]
+    else:
+        missing = levels
+    results = _fetch.gather(*[(_ncss_cache.get_data, url, variables, time, box, level * 100,
+                               run)
+                              for level, variables in missing])
+
+    upper = None
+    if grid is not None:
+        upper = UpperAir(grid['lon'], grid['lat'], grid['valid'], time, box, url)
+    try:
+        for (level, variables), data in zip(missing, results):
+            if upper is None:
+                with _metrics.stage('decode'):
+                    first = data.variables[variables[0]]
+                    vtime = data.variables[first.dimensions[0]]
+                    valid = num2date(vtime[:], vtime.units)[0]
+                    upper = UpperAir(data.variables['lon'][:], data.variables['lat'][:],
+                                     valid, time, box, url)
+                if where is not None:
+                    _archive.save_grid(where, valid, _mapping(data, first), lon=upper.lon,
+                                       lat=upper.lat, x=_coord(data.variables['x']),
+                                       y=_coord(data.variables['y']))
+
+            for variable in variables:
+                with _metrics.stage('decode'):
+                    values = data.variables[variable][:].squeeze()
+                if where is not None:
+                    _archive.save(where, variable, level, values)
+                upper.fields[(variable, level)] = values
+    finally:
+        # The arrays are read, so the subsets' files can go.
+        for data in results:
+            data.close()
+
+    # Every field comes from the archive when there is one, so processes
+    # rendering the same run share its pages rather than holding copies.
+    if where is not None:
+        for level, variables in levels:
+            for variable in variables:
+                upper.fields[(variable, level)] = _archive.load(where, variable, level)
+
+    _fetched.append(upper)
+    return upper
+
+
+class Column(object):
+    # Every isobaric level of a set of variables for one valid time, held as
+    # one float32 cube per variable indexed (level, y, x), memory-mapped from
+    # the archive when there is one. Levels are in hPa, surface first; x/y
+    # are the native grid coordinates in `crs`.
+
+    def __init__(self, cubes, variables, levels, lon, lat, x, y, crs, valid, time, box,
+                 url):
+        self.cubes = cubes
+        self.variables = variables
+        self.levels = levels
+        self.lon = lon
+        self.lat = lat
+        self.x = x
+        self.y = y
+        self.crs = crs
+        self.valid = valid
+        self.time = time
+        self.box = box
+        self.url = url
+
+    def field(self, variable, level):
+        return self.cubes[self.variables.index(variable)][list(self.levels).index(level)]
+
+    def upper_air(self, levels):
+        # Level maps for the product scripts, sliced from the cube without
+        # another request. Later fetch_upper_air() calls reuse them.
+        upper = UpperAir(self.lon, self.lat, self.valid, self.time, self.box, self.url)
+        for level in levels:
+            for variable in self.variables:
+                upper.fields[(variable, level)] = self.field(variable, level)
+        _fetched.append(upper)
+        return upper
+
+    def profiles(self, lon, lat):
+        # Every variable on every level at each lon/lat point, interpolated
+        # from each cube in one pass; a mapped cube only reads the pages
+        # around the points. Returns variable -> (level, point).
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        xy = self.crs.transform_points(ccrs.PlateCarree(), lon, lat)
+        col = (xy[:, 0] - self.x[0]) / (self.x[1] - self.x[0])
+        row = (xy[:, 1] - self.y[0]) / (self.y[1] - self.y[0])
+
+        shape = (len(self.levels), len(lon))
+        coords = [np.broadcast_to(np.arange(shape[0])[:, None], shape),
+                  np.broadcast_to(row, shape), np.broadcast_to(col, shape)]
+        return dict((variable, map_coordinates(cube, coords, order=1, mode='nearest'))
+                    for variable, cube in zip(self.variables, self.cubes))
+
+    def sounding(self, lon, lat):
+        # Profiles at one point: variable -> (level,).
+        return dict((variable, profile[:, 0])
+                    for variable, profile in self.profiles([lon], [lat]).items())
+
+    def cross_section(self, path, steps=100):
+        # Profiles along a path of (lon, lat) waypoints, `steps` points spaced
+        # evenly by distance. Returns the points' lon, lat, distance along
+        # the path in km and variable -> (level, step).
+        path = np.asarray(path, dtype=float)
+        lon, lat = np.radians(path[:, 0]), np.radians(path[:, 1])
+        legs = 2 * 6371. * np.arcsin(np.sqrt(
+            np.sin(np.diff(lat) / 2) ** 2 +
+            np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2))
+        along = np.concatenate([[0], np.cumsum(legs)])
+        distance = np.linspace(0, along[-1], steps)
+        lons = np.interp(distance, along, path[:, 0])
+        lats = np.interp(distance, along, path[:, 1])
+        return lons, lats, distance, self.profiles(lons, lats)
+
+
+def _mapping(data, variable):
+    # Grid mapping attributes of a variable, for CFProjection.
+    return dict(data.variables[variable.grid_mapping].__dict__)
+
+
+def _coord(variable):
+    # Native grid coordinate in metres.
+    values = np.asarray(variable[:], dtype=float)
+    return values * 1000. if getattr(variable, 'units', '') == 'km' else values
+
+
+def fetch_column(variables, time, box=CONUS_BOX, url=RAP_CATALOG):
+    # All isobaric levels of the variables in one request. Levels missing
+    # from any variable are dropped so the cube is regular.
+    variables = sorted(variables)
+    where = _archive.directory(url, time, box) if _archive.ENABLED else None
+    column = _archived_column(where, variables, time, box, url)
+    if column is not None:
+        return column
+
+    with _ncss_cache.get_data(url, variables, time, box) as data:
+        first = data.variables[variables[0]]
+        vtime = data.variables[first.dimensions[0]]
+        valid = num2date(vtime[:], vtime.units)[0]
+
+        # Each variable's pressure levels in hPa, and those they all share.
+        pressures = {}
+        for variable in variables:
+            coord = data.variables[data.variables[variable].dimensions[1]]
+            scale = .01 if getattr(coord, 'units', 'Pa') == 'Pa' else 1.
+            pressures[variable] = np.round(np.asarray(coord[:], dtype=float) * scale, 1)
+        levels = sorted(set.intersection(*[set(p) for p in pressures.values()]), reverse=True)
+
+        ny, nx = data.variables['lat'].shape
+        cube = np.empty((len(variables), len(levels), ny, nx), dtype=np.float32)
+        for i, variable in enumerate(variables):
+            order = [list(pressures[variable]).index(level) for level in levels]
+            values = data.variables[variable][0]
+            cube[i] = np.ma.filled(values.astype(np.float32), np.nan)[order]
+
+        mapping = _mapping(data, first)
+        crs = CFProjection(mapping).to_cartopy()
+        column = Column(list(cube), variables, np.array(levels), data.variables['lon'][:],
+                        data.variables['lat'][:], _coord(data.variables['x']),
+                        _coord(data.variables['y']), crs, valid, time, box, url)
+
+    if where is not None:
+        _archive.save_grid(where, valid, mapping, lon=column.lon, lat=column.lat,
+                           x=column.x, y=column.y)
+        for i, variable in enumerate(variables):
+            _archive.save_column(where, variable, levels, cube[i])
+        # Hand back the mapped copy, so processes share its pages.
+        column = _archived_column(where, variables, time, box, url) or column
+    return column
+
+
+def _archived_column(where, variables, time, box, url):
+    # A column rebuilt from the archive, or None unless every variable was
+    # stored with all its levels.
+    grid = _archive.load_grid(where) if where is not None else None
+    if grid is None:
+        return None
+    stored = [_archive.levels(where, variable) for variable in variables]
+    if not all(stored):
+        return None
+    levels = sorted(set.intersection(*[set(l) for l in stored]), reverse=True)
+    cubes = []
+    for variable, have in zip(variables, stored):
+        cube = _archive.load_column(where, variable)
+        # Columns stored together share their levels, so this copies only
+        # when they were fetched apart.
+        cubes.append(cube if have == levels else cube[[have.index(l) for l in levels]])
+    crs = CFProjection(grid['mapping']).to_cartopy()
+    return Column(cubes, variables, np.array(levels), grid['lon'], grid['lat'],
+                  np.asarray(grid['x']), np.asarray(grid['y']), crs, grid['valid'], time,
+                  box, url)
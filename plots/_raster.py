@@ -0,0 +1,132 @@
+import hashlib
+import os
+
+import matplotlib.colors as colors
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+from scipy.ndimage import map_coordinates
+
+import _config
+import _metrics
+import _transform
+
+# Draw filled fields as images instead of contourf polygons with
+# PLOTS_RASTER_FILL=1. Index maps are kept here.
+RASTER = _config.flag('PLOTS_RASTER_FILL')
+RASTER_DIR = os.path.join(_config.CACHE_DIR, 'raster')
+
+# Index maps already loaded by this process.
+_maps = {}
+
+
+class IndexMap(object):
+    # Bilinear lookup from a grid onto the pixels of a map: for every output
+    # pixel the flat index of the grid cell corner below-left of it and its
+    # fractional position in that cell, or -1 off the grid.
+
+    def __init__(self, corner, wx, wy, nx):
+        self.corner = corner
+        self.wx = wx
+        self.wy = wy
+        self.nx = nx
+        self.outside = corner < 0
+        self._corner = np.where(self.outside, 0, corner)
+
+    def __call__(self, field):
+        # Interpolate one field onto the map with four gathers.
+        f = np.asarray(field, dtype=np.float32).ravel()
+        c, wx, wy = self._corner, self.wx, self.wy
+        bottom = f[c] + (f[c + 1] - f[c]) * wx
+        top = f[c + self.nx] + (f[c + self.nx + 1] - f[c + self.nx]) * wx
+        return bottom + (top - bottom) * wy
+
+
+def _build(grid, extent, shape, step=4):
+    # Fractional source row and column of every output pixel centre, top row
+    # first. Found by triangulating the projected grid on every `step`-th
+    # pixel and interpolating linearly in between, since the indices vary
+    # smoothly across the map.
+    ny, nx = grid.x.shape
+    rows, cols = np.mgrid[0:ny, 0:nx]
+    points = np.column_stack([grid.x.ravel(), grid.y.ravel()])
+    lookup = LinearNDInterpolator(points, np.column_stack([rows.ravel(), cols.ravel()]))
+
+    height, width = shape
+    x0, x1, y0, y1 = extent
+    px = np.arange(0, width + step, step)
+    py = np.arange(0, height + step, step)
+    tx, ty = np.meshgrid(x0 + (px + .5) * (x1 - x0) / width,
+                         y1 - (py + .5) * (y1 - y0) / height)
+    coarse = lookup(tx, ty)
+
+    fine = np.mgrid[0:height, 0:width].astype(np.float32) / step
+    row, col = [map_coordinates(coarse[..., i], fine, order=1, cval=np.nan)
+                for i in range(2)]
+
+    outside = np.isnan(row) | np.isnan(col)
+    row = np.where(outside, 0, row)
+    col = np.where(outside, 0, col)
+    r0 = np.clip(np.floor(row), 0, ny - 2)
+    c0 = np.clip(np.floor(col), 0, nx - 2)
+    corner = np.where(outside, -1, r0 * nx + c0).astype(np.int32)
+    return corner, (col - c0).astype(np.float32), (row - r0).astype(np.float32)
+
+
+def index_map(grid, projection, extent, shape):
+    # Where each output pixel falls on a projected grid. Built once per grid,
+    # map extent and pixel shape, and kept on disk.
+    digest = hashlib.md5()
+    for coord in (grid.x, grid.y):
+        digest.update(np.ascontiguousarray(coord).tobytes())
+    parts = [digest.hexdigest(), projection.proj4_init, np.round(extent, 3).tolist(),
+             list(shape)]
+    key = hashlib.sha256(repr(parts).encode()).hexdigest()
+    if key not in _maps:
+        path = os.path.join(RASTER_DIR, key + '.npz')
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                corner, wx, wy = saved['corner'], saved['wx'], saved['wy']
+        else:
+            corner, wx, wy = _build(grid, extent, shape)
+            os.makedirs(RASTER_DIR, exist_ok=True)
+            tmp = path + '.%d.npz' % os.getpid()
+            np.savez(tmp, corner=corner, wx=wx, wy=wy)
+            os.replace(tmp, path)
+        _maps[key] = IndexMap(corner, wx, wy, grid.x.shape[1])
+    return _maps[key]
+
+
+@_metrics.stage('contour')
+def contourf(ax, grid, field, levels, cmap=None, vmin=None, vmax=None, zorder=3,
+             dpi=150):
+    # Filled contours of a field on a projected grid. With PLOTS_RASTER_FILL
+    # the field is resampled onto the map's pixels and drawn as one image
+    # whose colours match contourf's; otherwise this is plain contourf. Both
+    # return something fig.colorbar() takes. Sampling at half the saved
+    # 300 dpi leaves band edges stepped by 2 pixels, and is 4x less work.
+    if not RASTER:
+        return ax.contourf(grid.x, grid.y, field, levels, cmap=cmap, vmin=vmin, vmax=vmax,
+                           zorder=zorder, transform=ax.projection)
+
+    levels = np.asarray(levels, dtype=float)
+    extent = ax.get_extent()
+    lookup = index_map(grid, ax.projection, extent, _transform.output_shape(ax, dpi))
+    values = lookup(getattr(field, 'magnitude', field))
+    outside = lookup.outside
+    band = np.searchsorted(levels, values, side='right') - 1
+    band[values == levels[-1]] = len(levels) - 2
+    band[outside | (values < levels[0]) | (values > levels[-1])] = -1
+
+    # contourf colours each band by its midpoint through the colormap. The
+    # image carries the bands' colormap and BoundaryNorm for the colorbar.
+    norm = colors.Normalize(levels[0] if vmin is None else vmin,
+                            levels[-1] if vmax is None else vmax)
+    bands = plt.get_cmap(cmap)(norm((levels[:-1] + levels[1:]) / 2.), bytes=True)
+    table = np.concatenate([bands, [[0, 0, 0, 0]]]).astype(np.uint8)
+    image = ax.imshow(table[band], extent=extent, origin='upper', transform=ax.projection,
+                      interpolation='nearest', zorder=zorder)
+    image.set_cmap(colors.ListedColormap(bands / 255.))
+    image.set_norm(colors.BoundaryNorm(levels, len(bands)))
+    ax.set_extent(extent, crs=ax.projection)
+    return image
@@ -0,0 +1,17 @@
+import numpy as np
+import scipy.ndimage as ndimage
+from metpy.units import units
+
+import _metrics
+
+
+@_metrics.stage('smooth')
+def smooth(fields, sigma):
+    # Gaussian-smooth fields that share a grid in a single pass. `fields`
+    # maps a name to (array, unit); the arrays are stacked as float32 and
+    # filtered along the two spatial axes only.
+    names = sorted(fields)
+    stack = np.stack([np.asarray(fields[name][0], dtype=np.float32) for name in names])
+    stack = ndimage.gaussian_filter(stack, sigma=(0, sigma, sigma), order=0)
+    return dict((name, units.Quantity(stack[i], fields[name][1]))
+                for i, name in enumerate(names))
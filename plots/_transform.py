@@ -0,0 +1,68 @@
+import hashlib
+
+import cartopy.crs as ccrs
+import numpy as np
+
+import _metrics
+
+# Grids already projected by this process, keyed by grid and projection.
+_grids = {}
+
+
+class ProjectedGrid(object):
+    # A lon/lat grid projected once onto a map projection. Layers drawn from
+    # x/y with transform=ax.projection skip cartopy's per-call projection.
+
+    def __init__(self, lon, lat, projection):
+        lon = np.asarray(lon, dtype=float)
+        lat = np.asarray(lat, dtype=float)
+        if lon.ndim == 1:
+            lon, lat = np.meshgrid(lon, lat)
+
+        pc = ccrs.PlateCarree()
+        xyz = projection.transform_points(pc, lon, lat)
+        self.x = xyz[..., 0]
+        self.y = xyz[..., 1]
+
+        # Map displacement per small step east and north at every point.
+        # cartopy turns u/v into a direction in lon/lat space the same way.
+        step = 1e-4
+        east = projection.transform_points(pc, lon + step, lat)
+        north = projection.transform_points(pc, lon, lat + step)
+        self._dlon = (east[..., 0] - self.x, east[..., 1] - self.y)
+        self._dlat = (north[..., 0] - self.x, north[..., 1] - self.y)
+
+    def vectors(self, u, v):
+        # Rotate earth-relative u/v onto the map, keeping their magnitude.
+        u = np.asarray(u)
+        v = np.asarray(v)
+        mu = u * self._dlon[0] + v * self._dlat[0]
+        mv = u * self._dlon[1] + v * self._dlat[1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scale = np.where(np.hypot(mu, mv) > 0, np.hypot(u, v) / np.hypot(mu, mv), 0)
+        return mu * scale, mv * scale
+
+
+def output_shape(ax, dpi=300):
+    # Pixel height and width of a map when the figure is saved at `dpi`.
+    ax.apply_aspect()
+    width, height = ax.figure.get_size_inches()
+    bounds = ax.get_position().bounds
+    return int(round(bounds[3] * height * dpi)), int(round(bounds[2] * width * dpi))
+
+
+def _grid_key(lon, lat, projection):
+    digest = hashlib.md5()
+    for coord in (lon, lat):
+        coord = np.ascontiguousarray(coord)
+        digest.update(str(coord.shape).encode())
+        digest.update(coord.tobytes())
+    return digest.hexdigest(), projection.proj4_init
+
+
+@_metrics.stage('project')
+def get(lon, lat, projection):
+    key = _grid_key(lon, lat, projection)
+    if key not in _grids:
+        _grids[key] = ProjectedGrid(lon, lat, projection)
+    return _grids[key]
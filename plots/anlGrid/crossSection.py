@@ -0,0 +1,186 @@
+import argparse
+from datetime import datetime
+import importlib
+import os
+import sys
+
+import cartopy.io.shapereader as shpreader
+import matplotlib.pyplot as plt
+import metpy.calc as mpcalc
+from metpy.plots import SkewT
+from metpy.units import units
+import numpy as np
+import shapely
+from shapely.geometry import Point
+from shapely.ops import polygonize, unary_union
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(HERE, '..'))
+import _config
+import _labels
+import _metrics
+import _rap
+
+import renderAll
+
+# Forecast area outline.
+FA_SHP = os.path.join(_config.MAP_FILES, 'fa', 'fa3.shp')
+
+# Default cross-section, west to east across the forecast area.
+PATH = [(-104.1, 35.6), (-95.5, 35.6)]
+
+# Every field the maps, cross-section and soundings draw from.
+VARIABLES = [_rap.HGHT, _rap.UWND, _rap.VWND, _rap.TEMP, _rap.RELH]
+
+
+def forecast_area():
+    # The forecast area polygon, closed up from its outline segments. Their
+    # ends miss each other by a few micro-degrees, so snap them first.
+    lines = shapely.set_precision(unary_union(list(shpreader.Reader(FA_SHP).geometries())),
+                                  1e-4)
+    return max(polygonize(lines), key=lambda polygon: polygon.area)
+
+
+def fa_points(spacing):
+    # Points every `spacing` degrees inside the forecast area.
+    area = forecast_area()
+    west, south, east, north = area.bounds
+    lons, lats = np.meshgrid(np.arange(west, east, spacing) + spacing / 2.,
+                             np.arange(south, north, spacing) + spacing / 2.)
+    return [(lon, lat) for lon, lat in zip(lons.ravel(), lats.ravel())
+            if area.contains(Point(lon, lat))]
+
+
+def _lonlat(text):
+    lon, lat = text.split(',')
+    return float(lon), float(lat)
+
+
+def plot_cross_section(column, path, out='./images/CROSS_SECTION.png'):
+    lons, lats, distance, profiles = column.cross_section(path)
+    pressure = column.levels * units.hPa
+    temp = (profiles[_rap.TEMP] * units.kelvin).to('degC').m
+    theta = mpcalc.potential_temperature(pressure[:, None],
+                                         profiles[_rap.TEMP] * units.kelvin).m
+    uwnd = (profiles[_rap.UWND] * units('m/s')).to('knots').m
+    vwnd = (profiles[_rap.VWND] * units('m/s')).to('knots').m
+
+    fig, ax = plt.subplots(figsize=(10, 6))
+    fill_temp = ax.contourf(distance, column.levels, temp, np.arange(-60, 42, 2),
+                            cmap='RdYlBu_r', extend='both', zorder=1)
+    cntr_theta = ax.contour(distance, column.levels, theta, np.arange(250, 450, 4),
+                            colors='black', linewidths=.5, zorder=2)
+    _labels.label(ax, cntr_theta, fontsize=5, color='black')
+
+    # Barbs on every 50 hPa and about 25 columns across.
+    step = max(1, len(distance) // 25)
+    rows = column.levels % 50 == 0
+    dist, pres = np.meshgrid(distance[::step], column.levels[rows])
+    ax.barbs(dist, pres, uwnd[rows, ::step], vwnd[rows, ::step], length=5, linewidth=.5,
+             zorder=3)
+
+    ax.set_yscale('log')
+    ax.set_ylim(column.levels.max(), 100)
+    ticks = [1000, 850, 700, 500, 300, 200, 100]
+    ax.set_yticks(ticks)
+    ax.set_yticklabels([str(tick) for tick in ticks])
+    ax.minorticks_off()
+    ax.set_xlim(distance[0], distance[-1])
+    ax.set_xlabel('%.1f, %.1f TO %.1f, %.1f (KM)' % (lons[0], lats[0], lons[-1], lats[-1]),
+                  fontsize=7)
+    ax.set_ylabel('PRESSURE (HPA)', fontsize=7)
+    ax.tick_params(labelsize=7)
+
+    plt.title("CROSS SECTION: TEMPERATURE, THETA & WIND", loc='left', fontsize=8,
+              fontweight='bold')
+    plt.title("DATA VALID: " + column.valid.strftime("%H:%M" + "Z"), loc='right',
+              fontsize=8, fontweight='bold')
+
+    cbar = fig.colorbar(fill_temp, pad=0.02)
+    cbar.ax.tick_params(labelsize=7)
+    cbar.outline.set_visible(False)
+    cbar.ax.tick_params(length=0)
+
+    with _metrics.stage('savefig'):
+        plt.savefig(out, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    return out
+
+
+def plot_sounding(column, lon, lat, out):
+    profile = column.sounding(lon, lat)
+    pressure = column.levels * units.hPa
+    temp = (profile[_rap.TEMP] * units.kelvin).to('degC')
+    dewp = mpcalc.dewpoint_from_relative_humidity(temp, profile[_rap.RELH] * units.percent)
+    uwnd = (profile[_rap.UWND] * units('m/s')).to('knots')
+    vwnd = (profile[_rap.VWND] * units('m/s')).to('knots')
+
+    fig = plt.figure(figsize=(8, 8))
+    skew = SkewT(fig)
+    skew.plot(pressure, temp, 'red', linewidth=1.5)
+    skew.plot(pressure, dewp, 'green', linewidth=1.5)
+    rows = column.levels % 50 == 0
+    skew.plot_barbs(pressure[rows], uwnd[rows], vwnd[rows], length=6)
+    skew.plot_dry_adiabats(linewidth=.5, alpha=.3)
+    skew.plot_moist_adiabats(linewidth=.5, alpha=.3)
+    skew.ax.set_ylim(column.levels.max(), 100)
+    skew.ax.set_xlim(-40, 50)
+
+    plt.title("RAP SOUNDING: %.2f, %.2f" % (lon, lat), loc='left', fontsize=8,
+              fontweight='bold')
+    plt.title("DATA VALID: " + column.valid.strftime("%H:%M" + "Z"), loc='right',
+              fontsize=8, fontweight='bold')
+
+    with _metrics.stage('savefig'):
+        plt.savefig(out, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Render RAP level maps, a cross-section and soundings from one '
+                    'full-column fetch.')
+    parser.add_argument('--path', nargs='+', type=_lonlat, metavar='LON,LAT',
+                        default=PATH, help='cross-section waypoints')
+    parser.add_argument('--sounding', action='append', type=_lonlat, metavar='LON,LAT',
+                        help='add a sounding at this point (repeatable)')
+    parser.add_argument('--fa-grid', type=float, metavar='DEG',
+                        help='add soundings every DEG degrees inside the forecast area')
+    parser.add_argument('--maps', nargs='*', default=sorted(renderAll.PRODUCTS),
+                        help='level map products to render (default: all)')
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.maps) - set(renderAll.PRODUCTS))
+    if unknown:
+        parser.error('unknown products: %s' % ', '.join(unknown))
+
+    # Soundings default to a point inside the forecast area.
+    points = list(args.sounding or [])
+    if args.fa_grid:
+        points += fa_points(args.fa_grid)
+    if not points:
+        point = forecast_area().representative_point()
+        points = [(point.x, point.y)]
+
+    os.chdir(HERE)
+
+    # One request for every level of every variable.
+    column = _rap.fetch_column(VARIABLES, datetime.utcnow())
+
+    # Level maps, sliced from the cube.
+    upper = column.upper_air(sorted(set(_rap.PRODUCTS[name][1] for name in args.maps)))
+    for name in args.maps:
+        importlib.import_module(renderAll.PRODUCTS[name]).render(upper,
+                                                                 './images/%s.png' % name)
+        print(name)
+
+    print(plot_cross_section(column, args.path))
+    for i, (lon, lat) in enumerate(points):
+        print(plot_sounding(column, lon, lat, './images/SOUNDING_%02d.png' % i))
+
+
+if __name__ == '__main__':
+    main()
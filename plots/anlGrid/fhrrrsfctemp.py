@@ -1,3 +1,6 @@
+import os
+import sys
+
 import cartopy
 import cartopy.crs as ccrs
 import cartopy.io.shapereader as shpreader
@@ -15,9 +18,18 @@ from netCDF4 import num2date
 import numpy as np
 import scipy.ndimage as ndimage
 import shapefile
-from siphon.catalog import TDSCatalog
 import xarray as xr
 
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _basemap
+import _domains
+import _labels
+import _metrics
+import _ncss_cache
+import _raster
+import _transform
+
 #----------
 #--------------------
 # SET VARIABLES & COLORMAP
@@ -40,34 +52,31 @@ cmap = colors.ListedColormap(['mediumorchid','darkorchid','rebeccapurple','indig
 #--------------------
 #----------
 
-# Grab the latest HRRR dataset.
-cat = TDSCatalog('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
-                 'grib/NCEP/HRRR/CONUS_2p5km/latest.xml')
-dataset = cat.datasets[0]
-ncss = dataset.subset()
-
-# Query the surface temperature data.
-sfctemp = ncss.query()
-sfctemp.variables(surface_temperature)
-sfctemp.vertical_level(2.0)
-sfctemp.add_lonlat().lonlat_box(north=40, south=31, east=266, west=255)
-sfctemp.time(now)
-sfctemp_data = ncss.get_data(sfctemp)
+# Grab the latest HRRR surface temperature data.
+sfctemp_data = _ncss_cache.get_data('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+                                    'grib/NCEP/HRRR/CONUS_2p5km/latest.xml',
+                                    [surface_temperature], now,
+                                    dict(north=40, south=31, east=266, west=255),
+                                    level=2.0)
 
 # Grab and correct variables.
-sfctemp_vars = units.K * sfctemp_data.variables[surface_temperature][:].squeeze()
-sfctemp_vars = sfctemp_vars.to('degF')
-fnl_sfctemp = ndimage.gaussian_filter(sfctemp_vars, sigma=1, order=0)
+with _metrics.stage('decode'):
+    sfctemp_vars = units.K * sfctemp_data.variables[surface_temperature][:].squeeze()
+    sfctemp_vars = sfctemp_vars.to('degF')
+with _metrics.stage('smooth'):
+    fnl_sfctemp = ndimage.gaussian_filter(sfctemp_vars, sigma=1, order=0)
 
 # Extract lon/lat.
-lon = sfctemp_data.variables['lon'][:]
-lat = sfctemp_data.variables['lat'][:]
+with _metrics.stage('decode'):
+    lon = sfctemp_data.variables['lon'][:]
+    lat = sfctemp_data.variables['lat'][:]
 
 # Grab time from data.
 time = sfctemp_data.variables[sfctemp_data.variables[surface_temperature].dimensions[0]]
 vtime = num2date(time[:], time.units)
 ntime = vtime[0]
 datatime = ntime.strftime("%H:%M" + "Z")
+sfctemp_data.close()
 
 #----------
 #--------------------
@@ -76,42 +85,17 @@ datatime = ntime.strftime("%H:%M" + "Z")
 #----------
 
 # Define projection.
-ax = plt.axes(projection=ccrs.LambertConformal(central_latitude=35, central_longitude=-98,
-                                               standard_parallels=(30, 60)))
+ax = plt.axes(projection=_domains.get('fa').projection())
 
 # Define projecton and figure properties.
 fig = plt.figure(1, figsize=(10,10))
-ax.set_extent([-104.1, -95.5, 32.1, 39.1], ccrs.PlateCarree())
-
-# Create the map features.
-ax.add_feature(cfeature.OCEAN.with_scale('50m'),facecolor='#F2F2F2',
-                                                edgecolor='black',
-                                                zorder=0,
-                                                linewidth=.5)
-ax.add_feature(cfeature.LAND.with_scale('50m'),edgecolor='black',
-                                               facecolor='#E1E1E1',
-                                               zorder=1)
-ax.add_feature(cfeature.BORDERS.with_scale('50m'),zorder=4,linewidth=.5,edgecolor='black')
-ax.add_feature(cfeature.COASTLINE.with_scale('50m'),zorder=4,linewidth=.5,edgecolor='black')
-ax.add_feature(cfeature.LAKES.with_scale('50m'),zorder=2,linewidth=.5,edgecolor='black',
-                                                facecolor='#F2F2F2')
-ax.add_feature(cfeature.STATES.with_scale('50m'),linewidth=.5,
-                                                 edgecolor='black',
-                                                 zorder=5)
-
-# Use the cartopy shapefile reader to import custom county map.
-reader = shpreader.Reader('/home/victoraalvarez/Documents/pythonScripts'
-                          '/pythonPlayground/mapFiles/county_map/countyl010g.shp')
-counties = list(reader.geometries())
-COUNTIES = cfeature.ShapelyFeature(counties, ccrs.PlateCarree())
-
-ax.add_feature(COUNTIES,linewidth=.5,facecolor='none',edgecolor='black',zorder=4
-                       ,alpha=.3)
-
-# Use the cartopy shapefile reader to import FORECAST AREA.
-reader = shpreader.Reader('/home/victoraalvarez/Documents/pythonScripts/'
-                          'pythonPlayground/mapFiles/fa/fa3.shp')
-fa = list(reader.geometries())
+ax.set_extent(_domains.get('fa').extent, ccrs.PlateCarree())
+
+# Add the cached map features and counties.
+_basemap.add_basemap(ax, 'hrrr')
+
+# Import the FORECAST AREA, read once per process.
+fa = _basemap.forecast_area()
 FA = cfeature.ShapelyFeature(fa, ccrs.PlateCarree())
 
 ax.add_feature(FA,linewidth=2,facecolor='none',edgecolor='black',zorder=7,
@@ -119,22 +103,21 @@ ax.add_feature(FA,linewidth=2,facecolor='none',edgecolor='black',zorder=7,
 ax.add_feature(FA,linewidth=.5,facecolor='none',edgecolor='white',zorder=8)
 
 # Remove border from plot.
-ax.background_patch.set_facecolor('none')
-ax.outline_patch.set_edgecolor('none')
+ax.patch.set_facecolor('none')
+ax.spines['geo'].set_visible(False)
+
+# Project the grid once for every layer on this map.
+grid = _transform.get(lon, lat, ax.projection)
 
 # Plot the dataset.
 step_sfctemp = np.arange(-10,115,5)
-fill_sfctemp = ax.contourf(lon, lat, fnl_sfctemp, step_sfctemp,cmap=cmap,
-                           vmin=-10,vmax=110,zorder=3,transform=ccrs.PlateCarree())
-cntr_sfctemp = ax.contour(lon, lat, fnl_sfctemp, step_sfctemp,colors='black',zorder=3,
+fill_sfctemp = _raster.contourf(ax, grid, fnl_sfctemp, step_sfctemp, cmap=cmap,
+                                vmin=-10, vmax=110, zorder=3)
+cntr_sfctemp = ax.contour(grid.x, grid.y, fnl_sfctemp, step_sfctemp,colors='black',zorder=3,
                           linewidths=.5,linestyles='solid',
-                          transform=ccrs.PlateCarree())
-
-sfctemp_lbl = ax.clabel(cntr_sfctemp, fontsize=6, colors='black', inline=1, inline_spacing=1,
-                                      fmt='%i')
+                          transform=ax.projection)
 
-for l in sfctemp_lbl:
-    l.set_rotation(0)
+sfctemp_lbl = _labels.label(ax, cntr_sfctemp, fontsize=6, color='black')
 
 # Add title & colorbar.
 df = '%m/%d/%Y %H:%M'
@@ -147,10 +130,11 @@ plt.title(timestamp,loc='right',fontsize=8,fontweight='bold',
 plt.suptitle("DATA VALID: " + datatime,fontsize=6,ha='right',fontweight='bold',
           x=0.764,y=0.094)
 
-cbar = fig.colorbar(fill_sfctemp, shrink=.997, anchor=0.1, pad=0.025)
+cbar = fig.colorbar(fill_sfctemp, shrink=.997, pad=0.025)
 cbar.ax.tick_params(labelsize=7)
 cbar.outline.set_visible(False)
 cbar.ax.tick_params(length=0)
 
 # Plot!
-plt.savefig('./images/HRRRSFCTEMP.png', dpi=300, bbox_inches='tight')
+with _metrics.stage('savefig'):
+    plt.savefig('./images/HRRRSFCTEMP.png', dpi=300, bbox_inches='tight')
@@ -0,0 +1,88 @@
+import argparse
+from datetime import datetime
+import importlib
+import multiprocessing
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(HERE, '..'))
+import _derived
+import _domains
+import _metrics
+import _rap
+
+# Product name -> script that renders it.
+PRODUCTS = {
+    '300MB': 'c300anl',
+    '500MB': 'c500anl',
+    '500MB_WIND': 'f500wind',
+    '500MB_TEMPS': 'f500temp',
+    '850MB_WIND': 'f850wind',
+}
+
+# Fields shared by every product in this run.
+_upper = None
+
+
+def _render(task):
+    name, domain = task
+    path = _domains.image_path(name, domain)
+    with _metrics.product(PRODUCTS[name], domain=domain):
+        importlib.import_module(PRODUCTS[name]).render(_upper, path, domain)
+    return path
+
+
+def main():
+    global _upper
+
+    parser = argparse.ArgumentParser(
+        description='Render the RAP analysis maps from one process and one fetch.')
+    parser.add_argument('products', nargs='*', default=sorted(PRODUCTS),
+                        help='products to render (default: all of %s)'
+                             % ', '.join(sorted(PRODUCTS)))
+    parser.add_argument('-d', '--domains', nargs='+', default=[_domains.DEFAULT],
+                        choices=sorted(_domains.DOMAINS), metavar='DOMAIN',
+                        help='render every product on each of these maps '
+                             '(default: %s; any of %s)'
+                             % (_domains.DEFAULT, ', '.join(sorted(_domains.DOMAINS))))
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='render in this many processes (default: one per domain)')
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.products) - set(PRODUCTS))
+    if unknown:
+        parser.error('unknown products: %s' % ', '.join(unknown))
+
+    os.chdir(HERE)
+
+    # Fetch every product's fields at once, over a box covering every domain.
+    _upper = _rap.fetch_upper_air(args.products, datetime.utcnow(),
+                                  box=_domains.box(args.domains))
+
+    # Smooth each level and derive the shared fields once, before any
+    # workers fork.
+    for level in sorted(set(_rap.PRODUCTS[name][1] for name in args.products)):
+        _upper.smoothed(level)
+    _derived.prepare(_upper, args.products)
+
+    # Import the product scripts up front so forked workers start warm.
+    for name in args.products:
+        importlib.import_module(PRODUCTS[name])
+
+    tasks = [(name, domain) for domain in args.domains for name in args.products]
+    jobs = args.jobs or len(args.domains)
+    if jobs > 1:
+        pool = multiprocessing.get_context('fork').Pool(min(jobs, len(tasks)))
+        with pool:
+            for path in pool.imap_unordered(_render, tasks):
+                print(path)
+    else:
+        for task in tasks:
+            print(_render(task))
+
+
+if __name__ == '__main__':
+    main()
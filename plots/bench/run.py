@@ -0,0 +1,280 @@
+import argparse
+from datetime import datetime, timedelta
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import runpy
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLOTS = os.path.dirname(HERE)
+
+# Serve everything from a cache of our own, never the network or the real
+# cache. The NCSS replay cache stands in for the data server: the model
+# subsets are written where fetched ones would be kept, so the products'
+# own fetch path reads them. The field archive is off, so every build
+# fetches and decodes its subsets rather than mapping the previous build's
+# arrays. County lines come from a generated fixture. Stage timings come
+# from _metrics. These are read when the helpers are imported.
+os.environ.setdefault('PLOTS_CACHE_DIR', os.path.join(
+    os.path.expanduser('~'), '.cache', 'pythonPlayground-bench'))
+os.environ['PLOTS_REPLAY'] = '1'
+os.environ['PLOTS_METRICS'] = '1'
+os.environ['PLOTS_ARCHIVE'] = '0'
+os.environ['PLOTS_COUNTY_SHP'] = os.path.join(os.environ['PLOTS_CACHE_DIR'], 'county_input',
+                                              'countyl010g.shp')
+
+import cartopy
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, PLOTS)
+import _config
+import _counties
+import _domains
+import _metrics
+import _ncss_cache
+import _rap
+import _raster
+
+import synthetic
+
+
+def _script(path):
+    # A product script imported by path, for its render().
+    name = 'bench_' + os.path.splitext(os.path.basename(path))[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PLOTS, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+f500wind = _script(os.path.join('anlGrid', 'f500wind.py'))
+visFM = _script(os.path.join('sat', 'visFM.py'))
+
+# Model run of every synthetic input, and valid time of the RAP fields.
+RUN = datetime(2026, 1, 1, 12)
+
+# Same request anlGrid/fhrrrsfctemp.py makes.
+HRRR_CATALOG = ('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+                'grib/NCEP/HRRR/CONUS_2p5km/latest.xml')
+HRRR_TEMP = 'Temperature_height_above_ground'
+HRRR_BOX = dict(north=40, south=31, east=266, west=255)
+
+# Default regression limits, in seconds per stage.
+THRESHOLDS = os.path.join(HERE, 'thresholds.json')
+
+# Scripts write ./images/<name>.png, so they run from WORK. Natural Earth
+# layers come from generated fixtures, drawn into the bench's own basemap
+# cache.
+WORK = os.path.join(_config.CACHE_DIR, 'work')
+IMAGES = os.path.join(WORK, 'images')
+NATURAL_EARTH = os.path.join(_config.CACHE_DIR, 'natural_earth')
+
+# Lowest threshold written, in seconds; below it timings are mostly noise.
+MIN_THRESHOLD = .01
+
+# Runs per product that fill the disk caches and are left out of the
+# medians.
+WARMUP = 1
+
+
+def _model_values(variable, pa, lat):
+    seed = sum(map(ord, variable)) + int(pa)
+    return synthetic.isobaric(variable, pa / 100., lat, synthetic.noise(lat.shape, 4, seed))
+
+
+def _surface_values(variable, height, lat):
+    return (300 - .8 * (lat - 30) + 3 * synthetic.noise(lat.shape, 12, 3)).astype(np.float32)
+
+
+def _hrrr_times():
+    # fhrrrsfctemp.py asks for the current hour; cover the next one too in
+    # case the clock turns over during the runs.
+    now = _ncss_cache.round_hour(datetime.utcnow())
+    return [now, now + timedelta(hours=1)]
+
+
+def prepare():
+    # Write the synthetic inputs where the NCSS cache looks for them, and
+    # record their runs as if seen online, unless already there. Then the
+    # Natural Earth and county fixtures.
+    os.makedirs(_ncss_cache.NCSS_DIR, exist_ok=True)
+    inputs = [
+        (_rap.RAP_CATALOG, synthetic.RAP, sorted([_rap.HGHT, _rap.UWND, _rap.VWND]),
+         _rap.CONUS_BOX, 50000, ('isobaric', 'Pa'), [50000.], _model_values, [RUN]),
+        (HRRR_CATALOG, synthetic.HRRR, [HRRR_TEMP], HRRR_BOX, 2.0,
+         ('height_above_ground1', 'm'), [2.], _surface_values, _hrrr_times()),
+    ]
+    for url, grid, variables, box, level, vertical, levels, values, times in inputs:
+        run = '%s_%s.grib2' % (grid['name'], RUN.strftime('%Y%m%d_%H%M'))
+        _ncss_cache._save_run(url, run)
+        for valid in times:
+            path = os.path.join(_ncss_cache.NCSS_DIR,
+                                _ncss_cache.cache_key(run, variables, valid, box, level) + '.nc')
+            if not os.path.exists(path):
+                print('writing %s' % os.path.basename(path))
+                synthetic.write_model(path, grid, RUN, valid, variables, box, vertical,
+                                      levels, values)
+
+    goes = os.path.join(_config.CACHE_DIR, 'goes_input',
+                        'OR_ABI-L2-CMIPC-M6C02_G16_s%s.nc' % RUN.strftime('%Y%j%H%M%S'))
+    if not os.path.exists(goes):
+        print('writing %s' % os.path.basename(goes))
+        os.makedirs(os.path.dirname(goes), exist_ok=True)
+        synthetic.write_goes(goes, RUN)
+
+    if not os.path.isdir(os.path.join(NATURAL_EARTH, 'shapefiles')):
+        print('writing Natural Earth fixtures')
+        synthetic.write_natural_earth(NATURAL_EARTH)
+    cartopy.config['pre_existing_data_dir'] = NATURAL_EARTH
+    if not os.path.exists(_counties.COUNTY_SHP):
+        print('writing county fixture')
+        synthetic.write_counties(_counties.COUNTY_SHP)
+
+    os.makedirs(IMAGES, exist_ok=True)
+    return synthetic.LocalDataset(goes)
+
+
+def rap_500mb_wind(inputs):
+    upper = _rap.fetch_upper_air(['500MB_WIND'], RUN)
+    f500wind.render(upper, os.path.join(IMAGES, '500MB_WIND.png'), _domains.DEFAULT)
+
+
+def hrrr_surface_temp(inputs):
+    # A script with no render(); run it whole, as renderd would.
+    os.chdir(WORK)
+    runpy.run_path(os.path.join(PLOTS, 'anlGrid', 'fhrrrsfctemp.py'), run_name='__main__')
+
+
+def goes_visible(inputs):
+    visFM.render(inputs, os.path.join(IMAGES, 'VISIBLE.png'))
+
+
+PRODUCTS = {
+    'rap_500mb_wind': rap_500mb_wind,
+    'hrrr_surface_temp': hrrr_surface_temp,
+    'goes_visible': goes_visible,
+}
+
+
+def _timed(name, inputs):
+    # Build a product once and return its _metrics stage totals.
+    with _metrics.product(name) as stages:
+        PRODUCTS[name](inputs)
+    plt.close('all')
+    return stages
+
+
+def build(name, inputs):
+    # Each build gets a fresh forked process, as under renderd or cron:
+    # in-process caches start empty, the disk caches carry over.
+    with multiprocessing.get_context('fork').Pool(1) as pool:
+        return pool.apply(_timed, (name, inputs))
+
+
+def _summary(cold, runs):
+    # Wall time of each stage on the warm-up build, and the median and
+    # fastest of the builds after it, with the highest RSS seen.
+    summary = {}
+    for name in sorted(set(cold).union(*runs)):
+        times = [stages[name][1] for stages in runs if name in stages]
+        summary[name] = {'cold': round(cold[name][1], 4) if name in cold else None,
+                         'median': round(float(np.median(times)), 4) if times else None,
+                         'min': round(min(times), 4) if times else None,
+                         'peak_rss_mb': round(max(stages[name][3] for stages in runs + [cold]
+                                                  if name in stages) / 1e6, 1)}
+    return summary
+
+
+def check(results, thresholds):
+    # Stages whose median time went over their threshold, or that did not
+    # run at all.
+    failures = []
+    for product, stages in sorted(thresholds.items()):
+        if product not in results:
+            continue
+        for name, limit in sorted(stages.items()):
+            measured = results[product]['stages'].get(name, {}).get('median')
+            if measured is None:
+                failures.append('%s/%s: did not run' % (product, name))
+            elif measured > limit:
+                failures.append('%s/%s: %.3fs > %.3fs' % (product, name, measured, limit))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time each stage of the products on synthetic RAP, HRRR and GOES '
+                    'inputs, offline.')
+    parser.add_argument('products', nargs='*', default=sorted(PRODUCTS),
+                        help='products to time (default: all of %s)'
+                             % ', '.join(sorted(PRODUCTS)))
+    parser.add_argument('-r', '--repeat', type=int, default=3,
+                        help='timed runs per product, after %d warm-up run that builds the '
+                             'disk caches' % WARMUP)
+    parser.add_argument('-o', '--output', help='write the results as JSON here')
+    parser.add_argument('--thresholds', default=THRESHOLDS,
+                        help='per-stage limits in seconds (default: %(default)s)')
+    parser.add_argument('--no-check', dest='check', action='store_false',
+                        help='report only; do not fail on slow stages')
+    parser.add_argument('--write-thresholds', type=float, metavar='FACTOR',
+                        help='set the thresholds to FACTOR times the measured medians')
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.products) - set(PRODUCTS))
+    if unknown:
+        parser.error('unknown products: %s' % ', '.join(unknown))
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+
+    inputs = prepare()
+    results = {}
+    for name in args.products:
+        for _ in range(WARMUP):
+            cold = build(name, inputs)
+        runs = [build(name, inputs) for _ in range(args.repeat)]
+        results[name] = {'stages': _summary(cold, runs)}
+        for stage, times in sorted(results[name]['stages'].items()):
+            print('%-18s %-9s cold %7.3fs  median %7.3fs  peak %6.0f MB'
+                  % (name, stage, times['cold'] or 0, times['median'] or 0,
+                     times['peak_rss_mb']))
+
+    report = {'time': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+              'python': platform.python_version(), 'machine': platform.machine(),
+              'repeat': args.repeat, 'warmup': WARMUP, 'raster': _raster.RASTER,
+              'products': results}
+
+    if args.write_thresholds:
+        thresholds = dict((name, dict((stage, max(round(times['median'] * args.write_thresholds,
+                                                        3), MIN_THRESHOLD))
+                                      for stage, times in result['stages'].items()
+                                      if times['median'] is not None))
+                          for name, result in results.items())
+        with open(args.thresholds, 'w') as f:
+            json.dump(thresholds, f, indent=1, sort_keys=True)
+            f.write('\n')
+
+    failures = []
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            failures = check(results, json.load(f))
+    report['failures'] = failures
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.write('\n')
+    for failure in failures:
+        print('SLOW ' + failure)
+    if failures and args.check:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
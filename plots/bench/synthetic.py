@@ -0,0 +1,280 @@
+import os
+
+import cartopy.crs as ccrs
+from netCDF4 import Dataset
+import numpy as np
+import scipy.ndimage as ndimage
+import shapefile
+
+# Native grids of the served datasets: Lambert conformal on a sphere, with
+# the first grid point (south-west corner) in lon/lat, spacing in metres
+# and size. These match the GRIB grids behind the catalogs.
+RAP = dict(name='RAP_CONUS_13km', lat0=25., lon0=265., parallels=(25., 25.), radius=6371229.,
+           lon1=-126.138, lat1=16.281, dx=13545.087, nx=451, ny=337)
+HRRR = dict(name='HRRR_CONUS_2p5km', lat0=25., lon0=265., parallels=(25., 25.),
+            radius=6371200., lon1=-121.554, lat1=20.192, dx=2539.703, nx=2145, ny=1377)
+
+# GOES-East Channel 2 on the data server: 0.5 km Lambert conformal tiles
+# stitched across CONUS, 12-bit counts stored as unsigned int16.
+GOES = dict(lat0=25., lon0=-95., parallels=(25., 25.), radius=6371200.,
+            x0=-2600000., y0=2400000., dx=500., nx=10000, ny=6000)
+
+
+def _crs(grid):
+    globe = ccrs.Globe(ellipse='sphere', semimajor_axis=grid['radius'],
+                       semiminor_axis=grid['radius'])
+    return ccrs.LambertConformal(central_longitude=grid['lon0'],
+                                 central_latitude=grid['lat0'],
+                                 standard_parallels=grid['parallels'], globe=globe)
+
+
+def model_grid(grid):
+    # x/y (metres) and lon/lat of every point of a model grid.
+    crs = _crs(grid)
+    x0, y0 = crs.transform_point(grid['lon1'], grid['lat1'], ccrs.PlateCarree())
+    x = x0 + grid['dx'] * np.arange(grid['nx'])
+    y = y0 + grid['dx'] * np.arange(grid['ny'])
+    xx, yy = np.meshgrid(x, y)
+    lonlat = ccrs.PlateCarree().transform_points(crs, xx, yy)
+    return x, y, lonlat[..., 0], lonlat[..., 1]
+
+
+def subset(grid, box):
+    # Index window NCSS returns for a lon/lat box: every row and column
+    # holding a point inside it. Box longitudes are 0-360.
+    x, y, lon, lat = model_grid(grid)
+    inside = ((lat >= box['south']) & (lat <= box['north']) &
+              (lon % 360 >= box['west']) & (lon % 360 <= box['east']))
+    rows = np.flatnonzero(inside.any(axis=1))
+    cols = np.flatnonzero(inside.any(axis=0))
+    window = slice(rows[0], rows[-1] + 1), slice(cols[0], cols[-1] + 1)
+    return x[window[1]], y[window[0]], lon[window], lat[window]
+
+
+def noise(shape, sigma, seed):
+    # Smooth random field with unit spread, the same for every call.
+    field = ndimage.gaussian_filter(np.random.RandomState(seed).standard_normal(shape), sigma)
+    return field / field.std()
+
+
+def _standard_height(hpa):
+    return 44330.8 * (1 - (hpa / 1013.25) ** 0.190263)
+
+
+def isobaric(variable, hpa, lat, texture):
+    # Plausible values of a RAP isobaric field: a standard atmosphere with a
+    # north-south gradient, a jet near 40N and smooth waves on top.
+    jet = np.exp(-((lat - 40) / 8.) ** 2)
+    if variable.startswith('Geopotential_height'):
+        return _standard_height(hpa) + 12 * (40 - lat) * (1 + (1000 - hpa) / 500.) + 60 * texture
+    if variable.startswith('Temperature'):
+        return 288.15 * (hpa / 1013.25) ** 0.190263 + .6 * (40 - lat) + 2 * texture
+    if variable.startswith('u-component'):
+        return 8 + 35 * (1000 - hpa) / 700. * jet + 6 * texture
+    if variable.startswith('v-component'):
+        return 8 * texture
+    if variable.startswith('Relative_humidity'):
+        return np.clip(55 + 30 * texture, 1, 100)
+    raise KeyError(variable)
+
+
+def _units(variable):
+    for prefix, unit in (('Geopotential_height', 'gpm'), ('Temperature', 'K'),
+                         ('u-component', 'm/s'), ('v-component', 'm/s'),
+                         ('Relative_humidity', '%')):
+        if variable.startswith(prefix):
+            return unit
+
+
+def write_model(path, grid, run, valid, variables, box, vertical, levels, values):
+    # An NCSS netCDF subset as the server returns it: one time, the
+    # requested vertical levels, projected x/y in km, 2-D lat/lon and the
+    # grid mapping. `values(variable, level, lat)` fills each level.
+    x, y, lon, lat = subset(grid, box)
+    hours = (valid - run).total_seconds() / 3600.
+
+    tmp = path + '.%d' % os.getpid()
+    with Dataset(tmp, 'w') as nc:
+        nc.createDimension('time', 1)
+        nc.createDimension(vertical[0], len(levels))
+        nc.createDimension('y', len(y))
+        nc.createDimension('x', len(x))
+
+        time = nc.createVariable('time', 'f8', ('time',))
+        time.units = 'Hour since %s' % run.strftime('%Y-%m-%dT%H:%M:%SZ')
+        time[:] = [hours]
+        level = nc.createVariable(vertical[0], 'f4', (vertical[0],))
+        level.units = vertical[1]
+        level[:] = levels
+        for name, coord in (('x', x), ('y', y)):
+            var = nc.createVariable(name, 'f4', (name,))
+            var.units = 'km'
+            var[:] = coord / 1000.
+        for name, coord, unit in (('lat', lat, 'degrees_north'), ('lon', lon, 'degrees_east')):
+            var = nc.createVariable(name, 'f8', ('y', 'x'))
+            var.units = unit
+            var[:] = coord
+
+        mapping = nc.createVariable('LambertConformal_Projection', 'i4')
+        mapping.grid_mapping_name = 'lambert_conformal_conic'
+        mapping.latitude_of_projection_origin = grid['lat0']
+        mapping.longitude_of_central_meridian = grid['lon0']
+        mapping.standard_parallel = grid['parallels'][0]
+        mapping.earth_radius = grid['radius']
+
+        for variable in variables:
+            var = nc.createVariable(variable, 'f4', ('time', vertical[0], 'y', 'x'),
+                                    zlib=False)
+            var.units = _units(variable)
+            var.grid_mapping = 'LambertConformal_Projection'
+            for k, value in enumerate(levels):
+                var[0, k] = values(variable, value, lat)
+        nc.title = '%s synthetic subset for benchmarks' % grid['name']
+    os.replace(tmp, path)
+
+
+def write_goes(path, start, grid=GOES):
+    # A GOES Channel 2 tile file: counts with the packing, fill and grid
+    # mapping attributes of the real files, and scan start in the global
+    # attributes. Clouds are smooth noise at coarse scale plus pixel grain.
+    shape = (grid['ny'], grid['nx'])
+    coarse = noise((shape[0] // 20, shape[1] // 20), 3, 7)
+    clouds = ndimage.zoom(coarse, 20, order=1)[:shape[0], :shape[1]]
+    reflectance = np.clip(.08 + .4 * np.maximum(clouds, 0), 0, 1)
+    counts = (reflectance * 4095).astype(np.int16)
+    counts += np.random.RandomState(8).randint(0, 40, size=shape, dtype=np.int16)
+
+    tmp = path + '.%d' % os.getpid()
+    with Dataset(tmp, 'w') as nc:
+        nc.createDimension('y', shape[0])
+        nc.createDimension('x', shape[1])
+        for name, first, step, size in (('x', grid['x0'], grid['dx'], shape[1]),
+                                        ('y', grid['y0'], -grid['dx'], shape[0])):
+            var = nc.createVariable(name, 'f4', (name,))
+            var.units = 'm'
+            var[:] = first + step * np.arange(size)
+
+        mapping = nc.createVariable('lambert_projection', 'i4')
+        mapping.grid_mapping_name = 'lambert_conformal_conic'
+        mapping.latitude_of_projection_origin = grid['lat0']
+        mapping.longitude_of_central_meridian = grid['lon0']
+        mapping.standard_parallel = grid['parallels'][0]
+        mapping.earth_radius = grid['radius']
+
+        var = nc.createVariable('Sectorized_CMI', 'i2', ('y', 'x'), fill_value=np.int16(-1))
+        var._Unsigned = 'true'
+        var.scale_factor = np.float32(1 / 4095.)
+        var.add_offset = np.float32(0)
+        var.grid_mapping = 'lambert_projection'
+        var.units = '1'
+        var.set_auto_maskandscale(False)
+        var[:] = counts
+
+        nc.start_date_time = start.strftime('%Y%j%H%M%S')
+        nc.title = 'GOES-16 Channel 2 synthetic tile for benchmarks'
+    os.replace(tmp, path)
+
+
+# A rough North American coast, lon/lat, clockwise; write_natural_earth
+# roughens it into a few thousand points like the 50m coastline.
+COAST = [(-125, 49), (-130, 55), (-95, 60), (-60, 60), (-55, 52), (-60, 47), (-67, 45),
+         (-70, 41.5), (-76, 35), (-80, 31), (-81, 25), (-83, 29.5), (-90, 29), (-97.5, 26),
+         (-97, 21), (-105, 20), (-110, 23), (-117, 32.5), (-124, 40)]
+LAKES = [(-87, 44, 1.2, 2.5), (-82.5, 44.5, 1.3, 1.2), (-81, 42.2, 2.2, .5),
+         (-78, 43.6, 1.4, .4), (-88, 47.7, 3, .8), (-112.5, 41.1, .5, .6)]
+BORDERS = [[(-123, 49), (-95, 49)],
+           [(-117, 32.5), (-111, 31.3), (-108, 31.3), (-106.5, 31.8), (-103, 29),
+            (-99, 26.5), (-97.2, 25.9)]]
+
+
+def _ring(points, clockwise=True):
+    # Close a ring and wind it the way shapefiles want: outer rings
+    # clockwise, holes counter-clockwise.
+    points = [tuple(p) for p in points]
+    if points[0] != points[-1]:
+        points.append(points[0])
+    x, y = np.array(points).T
+    if (np.dot(x[:-1], y[1:]) - np.dot(x[1:], y[:-1]) < 0) != clockwise:
+        points.reverse()
+    return points
+
+
+def _coast(step=.05, seed=9):
+    # The coast with a point every `step` degrees, each nudged sideways.
+    points = []
+    corners = COAST + COAST[:1]
+    rng = np.random.RandomState(seed)
+    for (x0, y0), (x1, y1) in zip(corners[:-1], corners[1:]):
+        n = max(int(np.hypot(x1 - x0, y1 - y0) / step), 1)
+        t = np.arange(n) / float(n)
+        wiggle = ndimage.gaussian_filter1d(rng.standard_normal(n), 3) * 4 * step
+        length = np.hypot(x1 - x0, y1 - y0)
+        points.extend(zip(x0 + t * (x1 - x0) - wiggle * (y1 - y0) / length,
+                          y0 + t * (y1 - y0) + wiggle * (x1 - x0) / length))
+    return points
+
+
+def _write_shapes(path, kind, shapes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with shapefile.Writer(path, shapeType=kind) as shp:
+        shp.field('name', 'C', 40)
+        for name, parts in shapes:
+            if kind == shapefile.POLYGON:
+                shp.poly(parts)
+            else:
+                shp.line(parts)
+            shp.record(name)
+
+
+def write_natural_earth(directory, scale='50m'):
+    # Stand-in Natural Earth layers for the map features the products draw,
+    # laid out as cartopy looks for them under its pre_existing_data_dir:
+    # land and ocean split along one coast, lakes, borders and a grid of
+    # "states".
+    root = os.path.join(directory, 'shapefiles', 'natural_earth')
+    coast = _coast()
+    lakes = [_ring([(x + rx * np.cos(a), y + ry * np.sin(a))
+                    for a in np.linspace(0, 2 * np.pi, 120, endpoint=False)])
+             for x, y, rx, ry in LAKES]
+    states = [('%d_%d' % (x, y), [_ring([(x, y), (x, y + 4), (x + 4, y + 4), (x + 4, y)])])
+              for x in range(-125, -67, 4) for y in range(25, 49, 4)]
+    layers = [
+        ('physical', 'land', shapefile.POLYGON, [('land', [_ring(coast)])]),
+        ('physical', 'ocean', shapefile.POLYGON,
+         [('ocean', [_ring([(-180, -90), (-180, 90), (180, 90), (180, -90)]),
+                     _ring(coast, clockwise=False)])]),
+        ('physical', 'coastline', shapefile.POLYLINE, [('coast', [_ring(coast)])]),
+        ('physical', 'lakes', shapefile.POLYGON,
+         [('lake%d' % i, [lake]) for i, lake in enumerate(lakes)]),
+        ('cultural', 'admin_0_boundary_lines_land', shapefile.POLYLINE,
+         [('border%d' % i, [line]) for i, line in enumerate(BORDERS)]),
+        ('cultural', 'admin_1_states_provinces_lakes', shapefile.POLYGON, states),
+    ]
+    for category, name, kind, shapes in layers:
+        _write_shapes(os.path.join(root, category, 'ne_%s_%s' % (scale, name)), kind, shapes)
+
+
+def write_counties(path, step=.5, seed=10):
+    # Stand-in county boundary lines: the edges of a jittered grid over
+    # CONUS, one polyline per cell's south and east edges, like the line
+    # records of countyl010g.shp. Writes the .shp, .shx and .dbf.
+    lon, lat = np.meshgrid(np.arange(-125, -66, step), np.arange(24, 50, step))
+    jitter = np.random.RandomState(seed).uniform(-.15, .15, size=(2,) + lon.shape) * step
+    x, y = lon + jitter[0], lat + jitter[1]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with shapefile.Writer(os.path.splitext(path)[0], shapeType=shapefile.POLYLINE) as shp:
+        shp.field('name', 'C', 20)
+        for j in range(lon.shape[0] - 1):
+            for i in range(lon.shape[1] - 1):
+                shp.line([[(x[j + 1, i], y[j + 1, i]), (x[j, i], y[j, i]),
+                           (x[j, i + 1], y[j, i + 1])]])
+                shp.record('%d_%d' % (j, i))
+
+
+class LocalDataset(object):
+    # Stand-in for a siphon catalog dataset whose OPeNDAP URL is a local
+    # file; xarray opens either the same way.
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.access_urls = {'OPENDAP': path}
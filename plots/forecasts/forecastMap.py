@@ -1,3 +1,6 @@
+import os
+import sys
+
 import cartopy
 import cartopy.crs as ccrs
 import cartopy.io.shapereader as shpreader
@@ -9,6 +12,12 @@ import matplotlib.patheffects as PathEffects
 import numpy as np
 import shapefile
 
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _basemap
+import _counties
+import _metrics
+
 # Define the projection.
 ax = plt.axes(projection=ccrs.LambertConformal(central_latitude=35, central_longitude=-98,
                                                standard_parallels=(30, 60)))
@@ -31,19 +40,14 @@ ax.add_feature(cfeature.STATES.with_scale('50m'),linewidth=.5,
                                                  edgecolor='black',
                                                  zorder=6)
 
-# Use the cartopy shapefile reader to import custom county map.
-reader = shpreader.Reader('/home/victoraalvarez/Documents/pythonScripts'
-                          '/pythonPlayground/mapFiles/county_map/countyl010g.shp')
-counties = list(reader.geometries())
-COUNTIES = cfeature.ShapelyFeature(counties, ccrs.PlateCarree())
+# Load the county lines clipped to this map.
+COUNTIES = _counties.load([-104.1, -95.5, 32.1, 39.1]).feature()
 
 ax.add_feature(COUNTIES,linewidth=.5,facecolor='none',edgecolor='black',zorder=4,
                         alpha=.2)
 
-# Use the cartopy shapefile reader to import FORECAST AREA.
-reader = shpreader.Reader('/home/victoraalvarez/Documents/pythonScripts/'
-                          'pythonPlayground/mapFiles/fa/fa3.shp')
-fa = list(reader.geometries())
+# Import the FORECAST AREA, read once per process.
+fa = _basemap.forecast_area()
 FA = cfeature.ShapelyFeature(fa, ccrs.PlateCarree())
 
 ax.add_feature(FA,linewidth=2.5,facecolor='none',edgecolor='black',zorder=7,
@@ -145,4 +149,5 @@ plt.title(timestamp,loc='right',fontsize=8,fontweight='bold',
           y=-0.09)
 
 # Plot!
-plt.savefig('./images/DAY1_FORECAST.png', dpi=300, bbox_inches='tight')
+with _metrics.stage('savefig'):
+    plt.savefig('./images/DAY1_FORECAST.png', dpi=300, bbox_inches='tight')
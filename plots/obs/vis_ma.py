@@ -4,6 +4,9 @@
 # ---------------------------------------
 # -------------------
 
+import os
+import sys
+
 import cartopy
 import cartopy.crs as ccrs
 import cartopy.io.shapereader as shpreader
@@ -26,6 +29,16 @@ from siphon.catalog import TDSCatalog
 import xarray as xr
 from xarray.backends import NetCDF4DataStore
 
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _config
+import _domains
+import _fetch
+import _goes
+import _metrics
+import _ncss_cache
+import _transform
+
 # -------------------
 # ---------------------------------------
 # SET VARIABLES
@@ -35,6 +48,9 @@ from xarray.backends import NetCDF4DataStore
 # Define current time using datetime module.
 now = datetime.utcnow()
 
+# Map domain.
+DOMAIN = _domains.get('plains')
+
 # Define datasets to wanted.
 mslp = 'MSLP_MAPS_System_Reduction_msl'
 vsfc_wind = 'v-component_of_wind_height_above_ground'
@@ -46,50 +62,44 @@ usfc_wind = 'u-component_of_wind_height_above_ground'
 # ---------------------------------------
 # -------------------
 
-# Use TDSCatalog to begin data access & grab latest file.
-cat_vis = TDSCatalog('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
-                     'satellite/goes/east/products/CloudAndMoistureImagery/'
-                     'CONUS/Channel02/current/catalog.xml')
-latestvis = cat_vis.datasets[-1]
+def grab_visible():
+    # Use TDSCatalog to begin data access & grab latest file.
+    cat_vis = TDSCatalog(_config.thredds('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+                                         'satellite/goes/east/products/CloudAndMoistureImagery/'
+                                         'CONUS/Channel02/current/catalog.xml'))
+    latestvis = cat_vis.datasets[-1]
 
-# Parse the data.
-xrdata = latestvis.remote_access(use_xarray=True)
-parsedvis = xrdata.metpy.parse_cf('Sectorized_CMI')
-geos_proj = parsedvis.metpy.cartopy_crs
+    # Read only the map extent, reduced to what a 10x15 inch, 300 dpi figure
+    # can show.
+    sat = _goes.load_visible(latestvis, DOMAIN.extent, (3000, 4500))
 
-# Grab the coordinates.
-x = parsedvis.metpy.x
-y = parsedvis.metpy.y
+    # Adjust reflectance straight into grey levels.
+    parsedvis = sat.levels()
 
-# Adjust reflectance.
-parsedvis = np.sqrt(parsedvis)
+    return parsedvis, sat
 
 # -------------------
 # ---------------------------------------
-# GRAB THE RAP SURFACE MSLP & WINDS
+# GRAB THE SATELLITE DATA & RAP SURFACE MSLP AT ONCE
 # ---------------------------------------
 # -------------------
 
-# Use TDSCatalog to begin data access, NCSS to subset, & grab latest file.
-rap_cat = TDSCatalog('https://thredds-test.unidata.ucar.edu/thredds/catalog/'
-                     'grib/NCEP/RAP/CONUS_13km/latest.xml')
-latestrap = rap_cat.datasets[0]
-ncss = latestrap.subset()
-
-# Query MSLP data.
-mslp_data = ncss.query()
-mslp_data.variables(mslp)
-mslp_data.add_lonlat().lonlat_box(north=44, south=27, east=271, west=250)
-mslp_data.time(now)
-mslp_dataq = ncss.get_data(mslp_data)
+# The RAP MSLP data comes through the local NCSS cache.
+(parsedvis, sat), mslp_dataq = _fetch.gather(
+    grab_visible,
+    (_ncss_cache.get_data, 'https://thredds-test.unidata.ucar.edu/thredds/catalog/'
+                           'grib/NCEP/RAP/CONUS_13km/latest.xml',
+     [mslp], now, dict(north=44, south=27, east=271, west=250)))
 
 # Correct variables.
 mslpc = mslp_dataq.variables[mslp][:].squeeze()
-fnl_mslp = ndimage.gaussian_filter(mslpc, sigma=2, order=0)
+with _metrics.stage('smooth'):
+    fnl_mslp = ndimage.gaussian_filter(mslpc, sigma=2, order=0)
 
 # Extract the lon/lat,
 lon = mslp_dataq.variables['lon'][:]
 lat = mslp_dataq.variables['lat'][:]
+mslp_dataq.close()
 
 #----------
 #--------------------
@@ -101,12 +111,14 @@ lat = mslp_dataq.variables['lat'][:]
 fig = plt.figure(figsize=(10, 15))
 
 # Define projection.
-lc = ccrs.LambertConformal(central_longitude=-97.5, central_latitude=35, 
-                           standard_parallels=(30,60))
-ax = fig.add_subplot(1, 1, 1, projection=lc)
-ax.set_extent([-109.1, -90.5, 28.1, 43.1], crs=ccrs.PlateCarree())
-ax.imshow(parsedvis, extent=(x[0], x[-1], y[-1], y[0]), transform=geos_proj,
-                 interpolation='none', cmap='Greys_r', origin='upper')
+ax = fig.add_subplot(1, 1, 1, projection=DOMAIN.projection())
+ax.set_extent(DOMAIN.extent, crs=ccrs.PlateCarree())
+
+# Project the RAP grid once for the MSLP contours.
+grid = _transform.get(lon, lat, ax.projection)
+
+# Reproject the satellite image through the cached lookup table.
+_goes.add_image(ax, sat, parsedvis, cmap='Greys_r')
 
 # Create the map.
 ax.add_feature(cfeature.OCEAN.with_scale('50m'),facecolor='slategrey',edgecolor='none',zorder=5)
@@ -124,8 +136,9 @@ ax.add_feature(cfeature.STATES.with_scale('50m'),linewidth=.5,
 
 # Plot MSLP data.
 cntr_mslp = np.arange(900, 1060, 4)
-cntr_mslp = ax.contour(lon, lat, fnl_mslp, colors='white',zorder=7, linewidths=.5,
-                       linestyles='solid', alpha=.6, transform=ccrs.PlateCarree())
+cntr_mslp = ax.contour(grid.x, grid.y, fnl_mslp, colors='white',zorder=7, linewidths=.5,
+                       linestyles='solid', alpha=.6, transform=ax.projection)
 
 # Plot!
-plt.savefig('./images/VISIBLE.png', dpi=300, bbox_inches='tight')
+with _metrics.stage('savefig'):
+    plt.savefig('./images/VISIBLE.png', dpi=300, bbox_inches='tight')
@@ -0,0 +1,197 @@
+import argparse
+import io
+import json
+import os
+import runpy
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import time
+import traceback
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, HERE)
+import _config
+import _metrics
+
+# Where the daemon listens, set with PLOTS_RENDERD_SOCKET.
+SOCKET = os.environ.get('PLOTS_RENDERD_SOCKET', os.path.join(_config.CACHE_DIR, 'renderd.sock'))
+
+# Libraries and helpers the product scripts import, loaded once by the
+# daemon so every render starts warm.
+PRELOAD = [
+    'cartopy.crs', 'cartopy.feature', 'cartopy.io.shapereader', 'matplotlib.pyplot',
+    'matplotlib.colors', 'matplotlib.patheffects', 'metpy.calc', 'metpy.plots',
+    'metpy.units', 'mpl_toolkits.axes_grid1', 'netCDF4', 'numpy', 'scipy.ndimage',
+    'scipy.interpolate', 'scipy.spatial', 'shapefile', 'shapely.geometry', 'siphon.catalog',
+    'siphon.ncss', 'xarray',
+    '_animate', '_archive', '_barbs', '_basemap', '_counties', '_derived', '_domains', '_fetch',
+    '_goes', '_halo', '_labels', '_metrics', '_ncss_cache', '_rap', '_raster', '_smooth',
+    '_transform',
+]
+
+
+def run_script(path, args):
+    # Run a product script as its own __main__, from its own directory, the
+    # way `python script.py args` would. Returns its exit status and output.
+    start = time.time()
+    with tempfile.TemporaryFile() as log:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        saved = os.dup(1), os.dup(2)
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        sys.stdout = io.TextIOWrapper(os.fdopen(os.dup(1), 'wb'), line_buffering=True)
+        sys.stderr = io.TextIOWrapper(os.fdopen(os.dup(2), 'wb'), line_buffering=True)
+        try:
+            os.chdir(os.path.dirname(path))
+            sys.path.insert(0, os.path.dirname(path))
+            sys.argv = [path] + list(args)
+            _metrics.begin()
+            runpy.run_path(path, run_name='__main__')
+            status = 0
+        except SystemExit as exit:
+            if exit.code is None or isinstance(exit.code, int):
+                status = exit.code or 0
+            else:
+                print(exit.code, file=sys.stderr)
+                status = 1
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            _metrics.end()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+        log.seek(0)
+        output = log.read().decode('utf-8', 'replace')
+    return {'status': status, 'output': output, 'seconds': round(time.time() - start, 3)}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # One job per connection: a JSON line in, a JSON line out. Each
+    # connection runs in a fork of the warm daemon, so scripts see a fresh
+    # copy of its state and cannot disturb it.
+
+    def handle(self):
+        job = json.loads(self.rfile.readline().decode())
+        if job.get('ping'):
+            reply = {'status': 0, 'pid': os.getppid()}
+        else:
+            reply = run_script(job['script'], job.get('args', []))
+        self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class _Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    pass
+
+
+def serve(path=SOCKET, warm=True):
+    for name in PRELOAD:
+        __import__(name)
+    if warm:
+        import _basemap
+        import _counties
+        import _domains
+        print('loaded %d basemap layers' % _basemap.preload())
+        # The shapes every render draws over its map, so forks share them.
+        _basemap.forecast_area()
+        if os.path.exists(_counties.COUNTY_SHP):
+            for domain in _domains.DOMAINS.values():
+                _counties.load(domain.extent)
+            print('loaded county lines for %d domains' % len(_domains.DOMAINS))
+        else:
+            print('no county lines at %s' % _counties.COUNTY_SHP)
+
+    if os.path.exists(path):
+        if ping(path):
+            raise RuntimeError('renderd is already running on %s' % path)
+        os.remove(path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    def stop(signum, frame):
+        raise SystemExit(0)
+    signal.signal(signal.SIGTERM, stop)
+
+    server = _Server(path, _Handler)
+    print('renderd listening on %s (pid %d)' % (path, os.getpid()))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def request(job, path=SOCKET):
+    # Send one job to the daemon and wait for its reply.
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+        client.sendall(json.dumps(job).encode() + b'\n')
+        with client.makefile('rb') as reply:
+            return json.loads(reply.readline().decode())
+    finally:
+        client.close()
+
+
+def ping(path=SOCKET):
+    # The daemon's pid, or None when none is listening.
+    try:
+        return request({'ping': True}, path)['pid']
+    except (OSError, ValueError):
+        return None
+
+
+def render(script, args=(), path=SOCKET):
+    # Run a product script in the daemon. Relative script paths are taken
+    # from the current directory.
+    return request({'script': os.path.abspath(script), 'args': list(args)}, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Keep the plotting libraries loaded in one process and run product '
+                    'scripts in it over a Unix socket.')
+    parser.add_argument('--socket', default=SOCKET, help='socket path (default: %(default)s)')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    start = commands.add_parser('serve', help='run the daemon in the foreground')
+    start.add_argument('--no-warm', dest='warm', action='store_false',
+                       help='skip loading cached basemap layers up front')
+    run = commands.add_parser('render', help='run a product script in the daemon')
+    run.add_argument('script', help='path to the script, e.g. anlGrid/c500anl.py')
+    run.add_argument('args', nargs=argparse.REMAINDER, help='arguments for the script')
+    commands.add_parser('ping', help='report whether the daemon is running')
+    commands.add_parser('stop', help='stop the daemon')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        serve(args.socket, args.warm)
+    elif args.command == 'render':
+        reply = render(args.script, args.args, args.socket)
+        sys.stdout.write(reply['output'])
+        print('%s: exit %d in %.2fs' % (args.script, reply['status'], reply['seconds']),
+              file=sys.stderr)
+        sys.exit(reply['status'])
+    else:
+        pid = ping(args.socket)
+        if pid is None:
+            print('renderd is not running')
+            sys.exit(1)
+        if args.command == 'stop':
+            os.kill(pid, signal.SIGTERM)
+            print('stopped renderd (pid %d)' % pid)
+        else:
+            print('renderd is running (pid %d)' % pid)
+
+
+if __name__ == '__main__':
+    main()
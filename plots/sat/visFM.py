@@ -1,3 +1,6 @@
+import os
+import sys
+
 import cartopy
 import cartopy.crs as ccrs
 import cartopy.io.shapereader as shpreader
@@ -13,71 +16,78 @@ from siphon.catalog import TDSCatalog
 import xarray as xr
 from xarray.backends import NetCDF4DataStore
 
-# Grab the latest data from the data server.
-cat = TDSCatalog('https://thredds.ucar.edu/thredds/catalog/satellite'
-                 '/goes/east/products/CloudAndMoistureImagery/CONUS/Channel02'
-                 '/current/catalog.xml')
-latest_data = cat.datasets[0]
-
-# Parse the data.
-data = latest_data.remote_access(use_xarray=True)
-sat_data = data.metpy.parse_cf('Sectorized_CMI')
-geos = sat_data.metpy.cartopy_crs
-
-# Extract cordinate information.
-x = sat_data.metpy.x
-y = sat_data.metpy.y
-
-# Correct reflectance.
-sat_data = np.sqrt(sat_data)
-
-# Set projection and colorbar information.
-fig = plt.figure(figsize=(10, 15))
-
-lc = ccrs.LambertConformal(central_longitude=-97.5, standard_parallels=(38.5,
-                                                                        38.5))
-ax = fig.add_subplot(1, 1, 1, projection=lc)
-ax.set_extent([-104.1, -95.5, 32.1, 39.1], crs=ccrs.PlateCarree())
-ax.imshow(sat_data, extent=(x[0], x[-1], y[-1], y[0]), transform=geos,
-                 interpolation='none', cmap='Greys_r', origin='upper')
-
-# Create the map.
-ax.add_feature(cfeature.OCEAN.with_scale('50m'),facecolor='slategrey',edgecolor='none',zorder=5)
-ax.add_feature(cfeature.LAND.with_scale('50m'),edgecolor='dimgray',
-                                               facecolor='#626262',
-                                               zorder=0)
-ax.add_feature(cfeature.BORDERS.with_scale('50m'),zorder=2)
-ax.add_feature(cfeature.LAKES.with_scale('50m'),linewidth=.5,
-                                                facecolor='lightsteelblue',
-                                                edgecolor='dimgray',
-                                                zorder=3)
-ax.add_feature(cfeature.STATES.with_scale('50m'),linewidth=.5,
-                                                 edgecolor='black',
-                                                 zorder=6)
-
-# Import the county map.
-reader = shpreader.Reader('/home/victoraalvarez/Documents/pythonScripts'
-                          '/pythonPlayground/mapFiles/county_map/countyl010g.shp')
-counties = list(reader.geometries())
-COUNTIES = cfeature.ShapelyFeature(counties, ccrs.PlateCarree())
-
-ax.add_feature(COUNTIES,linewidth=.5,facecolor='none',edgecolor='black',
-                        alpha=0.5, zorder=4)
-
-# Import the forecast area.
-reader = shpreader.Reader('/home/victoraalvarez/Documents/pythonScripts/'
-                          'pythonPlayground/mapFiles/fa/fa3.shp')
-fa = list(reader.geometries())
-FA = cfeature.ShapelyFeature(fa, ccrs.PlateCarree())
-
-ax.add_feature(FA,linewidth=2.5,facecolor='none',edgecolor='black',zorder=7)
-ax.add_feature(FA,linewidth=.5,facecolor='none',edgecolor='white',zorder=8)
-
-# Add titles and timestamp.
-timestamp = datetime.strptime(data.start_date_time, '%Y%j%H%M%S')
-
-plt.title('Valid Time: {}'.format(timestamp), loc='right')
-plt.title('GOES-EAST CONUS Ch. 2', loc='left')
-
-# Plot!
-plt.savefig('./images/VISIBLE.png', dpi=300, bbox_inches='tight')
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _basemap
+import _config
+import _counties
+import _goes
+import _metrics
+
+# Channel 2 scans on the data server.
+CATALOG = ('https://thredds.ucar.edu/thredds/catalog/satellite'
+           '/goes/east/products/CloudAndMoistureImagery/CONUS/Channel02'
+           '/current/catalog.xml')
+
+
+def render(dataset, path='./images/VISIBLE.png'):
+    # Read only the map extent, reduced to what a 10x15 inch, 300 dpi figure
+    # can show.
+    sat = _goes.load_visible(dataset, [-104.1, -95.5, 32.1, 39.1], (3000, 4500))
+
+    # Correct reflectance straight into grey levels.
+    sat_data = sat.levels()
+
+    # Set projection and colorbar information.
+    fig = plt.figure(figsize=(10, 15))
+
+    lc = ccrs.LambertConformal(central_longitude=-97.5, standard_parallels=(38.5,
+                                                                            38.5))
+    ax = fig.add_subplot(1, 1, 1, projection=lc)
+    ax.set_extent([-104.1, -95.5, 32.1, 39.1], crs=ccrs.PlateCarree())
+    _goes.add_image(ax, sat, sat_data, cmap='Greys_r')
+
+    # Create the map.
+    ax.add_feature(cfeature.OCEAN.with_scale('50m'),facecolor='slategrey',edgecolor='none',zorder=5)
+    ax.add_feature(cfeature.LAND.with_scale('50m'),edgecolor='dimgray',
+                                                   facecolor='#626262',
+                                                   zorder=0)
+    ax.add_feature(cfeature.BORDERS.with_scale('50m'),zorder=2)
+    ax.add_feature(cfeature.LAKES.with_scale('50m'),linewidth=.5,
+                                                    facecolor='lightsteelblue',
+                                                    edgecolor='dimgray',
+                                                    zorder=3)
+    ax.add_feature(cfeature.STATES.with_scale('50m'),linewidth=.5,
+                                                     edgecolor='black',
+                                                     zorder=6)
+
+    # Load the county lines clipped to this map.
+    COUNTIES = _counties.load([-104.1, -95.5, 32.1, 39.1]).feature()
+
+    ax.add_feature(COUNTIES,linewidth=.5,facecolor='none',edgecolor='black',
+                            alpha=0.5, zorder=4)
+
+    # Import the forecast area.
+    fa = _basemap.forecast_area()
+    FA = cfeature.ShapelyFeature(fa, ccrs.PlateCarree())
+
+    ax.add_feature(FA,linewidth=2.5,facecolor='none',edgecolor='black',zorder=7)
+    ax.add_feature(FA,linewidth=.5,facecolor='none',edgecolor='white',zorder=8)
+
+    # Add titles and timestamp.
+    timestamp = sat.start
+
+    plt.title('Valid Time: {}'.format(timestamp), loc='right')
+    plt.title('GOES-EAST CONUS Ch. 2', loc='left')
+
+    # Plot!
+    with _metrics.stage('savefig'):
+        plt.savefig(path, dpi=300, bbox_inches='tight')
+    plt.close(fig)
+
+
+if __name__ == '__main__':
+    # Grab the latest data from the data server.
+    cat = TDSCatalog(_config.thredds(CATALOG))
+    latest_data = cat.datasets[0]
+    render(latest_data)
@@ -0,0 +1,71 @@
+import argparse
+import os
+import sys
+import time
+
+from siphon.catalog import TDSCatalog
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _animate
+import _config
+
+import visFM
+
+# Rendered frames, one per scan, named after the scan's file.
+LOOP_DIR = './images/loop'
+
+
+def frame_path(dataset):
+    return os.path.join(LOOP_DIR, os.path.splitext(dataset.name)[0] + '.png')
+
+
+def latest_scans(frames):
+    # The newest scans in the catalog, oldest first. Scan files are named by
+    # their start time, so they sort by name.
+    cat = TDSCatalog(_config.thredds(visFM.CATALOG))
+    return sorted(cat.datasets.values(), key=lambda dataset: dataset.name)[-frames:]
+
+
+def update_loop(frames, path, fps=4):
+    # Render the scans that have no frame yet, drop frames that fell out of
+    # the loop and write the animation.
+    os.makedirs(LOOP_DIR, exist_ok=True)
+    paths = []
+    for dataset in latest_scans(frames):
+        frame = frame_path(dataset)
+        if not os.path.exists(frame):
+            print('rendering %s' % dataset.name)
+            tmp = '%s.%d.png' % (os.path.splitext(frame)[0], os.getpid())
+            visFM.render(dataset, tmp)
+            os.replace(tmp, frame)
+        paths.append(frame)
+
+    for name in os.listdir(LOOP_DIR):
+        old = os.path.join(LOOP_DIR, name)
+        if name.endswith('.png') and old not in paths:
+            os.remove(old)
+
+    return _animate.write_animation(paths, path, fps=fps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep a GOES-East visible loop up to date.')
+    parser.add_argument('-n', '--frames', type=int, default=12,
+                        help='scans in the loop')
+    parser.add_argument('-o', '--output', default='./images/VISIBLE_LOOP.gif',
+                        help='animation to write (.gif, .png or .mp4)')
+    parser.add_argument('--fps', type=float, default=4, help='animation frame rate')
+    parser.add_argument('--watch', type=float, metavar='SECONDS',
+                        help='check for new scans every SECONDS instead of once')
+    args = parser.parse_args()
+
+    while True:
+        print(update_loop(args.frames, args.output, args.fps))
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == '__main__':
+    main()
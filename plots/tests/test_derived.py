@@ -0,0 +1,61 @@
+from datetime import datetime
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _derived
+import _rap
+
+
+def _upper():
+    # A 0.25 degree grid with westerlies strengthening north- and eastward,
+    # temperature rising eastward and a 5400 m 1000-500 hPa layer.
+    lon, lat = np.meshgrid(np.arange(-105, -95, .25), np.arange(30, 40, .25))
+    upper = _rap.UpperAir(lon, lat, datetime(2026, 1, 1, 12), datetime(2026, 1, 1, 12),
+                          _rap.CONUS_BOX, _rap.RAP_CATALOG)
+    upper.fields[(_rap.UWND, 500)] = 20 + (lat - 30) + (lon + 105)
+    upper.fields[(_rap.VWND, 500)] = np.zeros_like(lon)
+    upper.fields[(_rap.TEMP, 500)] = 250 + (lon + 105)
+    upper.fields[(_rap.HGHT, 500)] = np.full_like(lon, 5500.)
+    upper.fields[(_rap.HGHT, 1000)] = np.full_like(lon, 100.)
+    return upper
+
+
+def _inside(field):
+    # Away from the edges the smoothing and finite differences leave alone.
+    return np.asarray(field.m)[5:-5, 5:-5]
+
+
+def test_nodes_read_their_inputs():
+    upper = _upper()
+    assert (_inside(_derived.get(upper, 'vorticity', 500)) < 0).all()
+    assert (_inside(_derived.get(upper, 'divergence', 500)) > 0).all()
+    assert (_inside(_derived.get(upper, 'temp_advection', 500)) < 0).all()
+    assert np.allclose(_derived.get(upper, 'thickness', 500).to('m').m, 5400)
+    assert np.allclose(_derived.get(upper, 'wind_speed', 500).m,
+                       upper.smoothed(500)[_rap.UWND].m)
+
+    # Grid spacing is worked out once and shared.
+    assert list(upper.derived).count((_derived.GRID, None, None)) == 1
+
+
+def test_product_fields_include_derived_inputs(monkeypatch):
+    monkeypatch.setitem(_derived.PRODUCTS, 'TEST', [('thickness', 500),
+                                                    ('temp_advection', 500)])
+    assert _derived.product_fields(['TEST']) == {
+        (_rap.HGHT, 500), (_rap.HGHT, 1000), (_rap.TEMP, 500), (_rap.UWND, 500),
+        (_rap.VWND, 500)}
+
+    monkeypatch.setitem(_rap.PRODUCTS, 'TEST', ((_rap.HGHT,), 500))
+    assert (_rap.HGHT, 1000) in _rap.product_fields(['TEST'])
+
+
+def test_missing_input_names_the_level():
+    upper = _upper()
+    del upper.fields[(_rap.HGHT, 1000)]
+    with pytest.raises(LookupError, match='1000 hPa'):
+        _derived.get(upper, 'thickness', 500)
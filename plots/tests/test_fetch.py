@@ -0,0 +1,61 @@
+import gc
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import os
+import sys
+import threading
+
+from siphon.catalog import TDSCatalog
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import _fetch
+
+CATALOG = (b'<?xml version="1.0" encoding="UTF-8"?>\n'
+           b'<catalog xmlns="http://www.unidata.ucar.edu/namespaces/thredds/InvCatalog/v1.0" '
+           b'name="test"><dataset name="latest.nc" urlPath="latest.nc"/></catalog>\n')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so a reused connection shows up as a single accept. Idle
+    # connections time out so the server can shut down.
+    protocol_version = 'HTTP/1.1'
+    timeout = 1
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(CATALOG)))
+        self.end_headers()
+        self.wfile.write(CATALOG)
+
+    def log_message(self, *args):
+        pass
+
+
+class _Server(HTTPServer):
+    connections = 0
+
+    def get_request(self):
+        self.connections += 1
+        return HTTPServer.get_request(self)
+
+
+def test_dropped_catalog_keeps_shared_session_open():
+    server = _Server(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = 'http://127.0.0.1:%d/catalog.xml' % server.server_port
+    try:
+        catalog = TDSCatalog(url)
+        assert catalog.session is _fetch._shared_session()
+        del catalog
+        gc.collect()
+
+        # The catalog's __del__ closed "its" session; the shared pool and
+        # its open connection must still be there for the next fetch.
+        response = _fetch._shared_session().get(url)
+        assert response.status_code == 200
+        assert server.connections == 1
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,90 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import os
+import subprocess
+import sys
+import time
+
+# Import the shared helpers in ./plots.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import _products
+
+import renderd
+
+
+def _build(name, daemon=False):
+    # Run a product's script, in the render daemon when one is up.
+    product = _products.PRODUCTS[name]
+    if daemon:
+        reply = renderd.render(os.path.join(product.directory(), product.command()[0]),
+                               product.args)
+        sys.stdout.write(reply['output'])
+        return name, reply['status']
+    result = subprocess.run([sys.executable] + product.command(), cwd=product.directory())
+    return name, result.returncode
+
+
+def cycle(names, jobs=1, force=False, dry_run=False):
+    # Poll the inputs of the named products once and rebuild the ones whose
+    # inputs moved on since they were last built. Returns the names rebuilt.
+    manifest = _products.load_manifest()
+    versions = _products.poll(set(i for name in names for i in _products.PRODUCTS[name].inputs))
+
+    todo = []
+    for name in sorted(names):
+        reason = 'forced' if force else _products.stale(name, versions, manifest)
+        if reason is not None:
+            print('%s: %s' % (name, reason))
+            todo.append(name)
+    if dry_run or not todo:
+        return []
+
+    daemon = renderd.ping() is not None
+    built = []
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(todo)))) as pool:
+        for future in as_completed([pool.submit(_build, name, daemon) for name in todo]):
+            name, code = future.result()
+            if code:
+                print('%s: failed (exit %d), will retry' % (name, code))
+                continue
+            # Record each product as it finishes, so an interrupted cycle
+            # keeps what it built.
+            _products.record(name, versions, manifest)
+            _products.save_manifest(manifest)
+            built.append(name)
+    return built
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Rebuild products when the model run, satellite scan or local '
+                    'file behind them changes.')
+    parser.add_argument('products', nargs='*', default=sorted(_products.PRODUCTS),
+                        help='products to keep current (default: all of %s)'
+                             % ', '.join(sorted(_products.PRODUCTS)))
+    parser.add_argument('--interval', type=float, default=120, metavar='SECONDS',
+                        help='seconds between polls (default: 120)')
+    parser.add_argument('--once', action='store_true', help='poll and rebuild once, then exit')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='rebuild this many products at once')
+    parser.add_argument('--force', action='store_true',
+                        help='rebuild on the first poll even if nothing changed')
+    parser.add_argument('-n', '--dry-run', action='store_true',
+                        help='report what would be rebuilt without building it')
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.products) - set(_products.PRODUCTS))
+    if unknown:
+        parser.error('unknown products: %s' % ', '.join(unknown))
+
+    force = args.force
+    while True:
+        cycle(args.products, args.jobs, force, args.dry_run)
+        force = False
+        if args.once:
+            return
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()